@@ -0,0 +1,60 @@
+# benchmarks/bench_chat_runner.py
+"""
+比較「在 Event Loop 上直接呼叫同步 send_message」與「ChatRunner 執行緒池」的處理時間。
+以 time.sleep 模擬一次 Gemini 對話 (含工具呼叫) 的阻塞延遲，不需任何 API Key。
+
+執行方式 (專案根目錄)：python benchmarks/bench_chat_runner.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chat_runner import ChatRunner
+
+USERS = 6
+MESSAGES_PER_USER = 2
+TURN_LATENCY = 0.3  # 模擬每次對話的阻塞秒數
+
+def fake_turn(user_id, seq, log):
+    """模擬同步的 chat_session.send_message"""
+    start = time.perf_counter()
+    time.sleep(TURN_LATENCY)
+    log.append((user_id, seq, start))
+    return f"reply {user_id}-{seq}"
+
+async def run_blocking():
+    log = []
+    async def handler(user_id, seq):
+        return fake_turn(user_id, seq, log)  # 直接在 Loop 上阻塞 (原本的寫法)
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(u, s) for s in range(MESSAGES_PER_USER) for u in range(USERS)))
+    return time.perf_counter() - start, log
+
+async def run_pooled():
+    log = []
+    runner = ChatRunner(max_workers=USERS)
+    start = time.perf_counter()
+    await asyncio.gather(*(runner.run(u, fake_turn, u, s, log) for s in range(MESSAGES_PER_USER) for u in range(USERS)))
+    elapsed = time.perf_counter() - start
+    runner.shutdown()
+    return elapsed, log
+
+def check_order(log):
+    """同一用戶的訊息必須依序處理"""
+    for user_id in range(USERS):
+        seqs = [seq for u, seq, _ in sorted(log, key=lambda x: x[2]) if u == user_id]
+        if seqs != sorted(seqs): return False
+    return True
+
+if __name__ == "__main__":
+    total = USERS * MESSAGES_PER_USER
+    print(f"{USERS} 位用戶 x {MESSAGES_PER_USER} 則訊息，每次對話 {TURN_LATENCY}s")
+
+    elapsed, log = asyncio.run(run_blocking())
+    print(f"- 阻塞 Event Loop : {elapsed:.2f}s ({total} 則依序處理)")
+
+    elapsed, log = asyncio.run(run_pooled())
+    print(f"- ChatRunner      : {elapsed:.2f}s (理論下限 {MESSAGES_PER_USER * TURN_LATENCY:.1f}s)，同用戶順序正確: {check_order(log)}")
@@ -0,0 +1,61 @@
+# benchmarks/bench_google_clients.py
+"""
+比較 get_google_service 的單次呼叫成本：
+- 原本：每次讀取 token.json、驗證憑證並呼叫 discovery.build
+- 快取：憑證常駐記憶體，Client 依 (服務, 版本) 快取
+以暫存的假 token.json 執行 (Token 設為尚未過期)，只量測建立 Client 的本地成本，不會連線 Google。
+
+執行方式 (專案根目錄)：python benchmarks/bench_google_clients.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from services import google_api
+
+SERVICES = [("sheets", "v4"), ("calendar", "v3"), ("tasks", "v1")]
+ROUNDS = 20
+
+def write_fake_token(path):
+    expiry = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
+    with open(path, "w") as f:
+        json.dump({
+            "token": "fake-access-token",
+            "refresh_token": "fake-refresh-token",
+            "client_id": "fake.apps.googleusercontent.com",
+            "client_secret": "fake-secret",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "expiry": expiry.isoformat() + "Z",
+        }, f)
+
+def legacy_get_service(service_name, version):
+    """原本的寫法 (每次重新讀檔並 build)。"""
+    creds = Credentials.from_authorized_user_file(google_api.TOKEN_FILE, google_api.SCOPES)
+    return build(service_name, version, credentials=creds)
+
+def bench(label, func):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for name, version in SERVICES:
+            assert func(name, version) is not None
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (ROUNDS * len(SERVICES)) * 1000
+    print(f"{label:<10} 共 {elapsed * 1000:8.1f} ms  每次 {per_call:7.3f} ms")
+    return per_call
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        google_api.TOKEN_FILE = google_api.credential_manager.token_file = os.path.join(tmp, "token.json")
+        write_fake_token(google_api.TOKEN_FILE)
+
+        print(f"{ROUNDS} 輪 x {len(SERVICES)} 個服務 ({', '.join(n for n, _ in SERVICES)})")
+        before = bench("原本", legacy_get_service)
+        after = bench("快取", google_api.get_google_service)
+        print(f"單次呼叫約快 {before / after:.0f} 倍")
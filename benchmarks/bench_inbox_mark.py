@@ -0,0 +1,80 @@
+# benchmarks/bench_inbox_mark.py
+"""
+比較 mark_inbox_as_read 標記 100 列的成本：
+- 原本：每列一次 values().update (N 次往返、N 單位寫入配額)
+- 改寫：一次 values().batchUpdate
+(改寫會先確認列號未超出 Inbox 的範圍；列出未讀項目時 Inbox 已在快取中，量測前先讀入快取)
+以本地的假 Sheets Service 模擬每次 HTTP 往返的延遲，不需任何憑證。
+
+執行方式 (專案根目錄)：python benchmarks/bench_inbox_mark.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sheet_records import COLUMN_LABELS
+from tools import scraper
+
+ROWS = 100
+ROUND_TRIP = 0.03  # 模擬每次 Sheets API 往返的秒數
+
+class _Request:
+    def __init__(self, service, kind, kwargs):
+        self.service, self.kind, self.kwargs = service, kind, kwargs
+
+    def execute(self):
+        time.sleep(ROUND_TRIP)
+        self.service.requests += 1
+        if self.kind == "update":
+            self.service.cells += 1
+        else:
+            self.service.cells += sum(len(d['values']) for d in self.kwargs['body']['data'])
+        return {}
+
+class _Values:
+    def __init__(self, values): self.values = values
+    def execute(self): return {"values": self.values}
+
+class FakeSheetsService:
+    """只實作 spreadsheets().values().get (Inbox 有 ROWS 筆) / update / batchUpdate。"""
+    def __init__(self):
+        self.requests = 0
+        self.cells = 0
+    def spreadsheets(self): return self
+    def values(self): return self
+    def get(self, **kwargs):
+        return _Values([COLUMN_LABELS["inbox"]] + [["2025-01-01", f"https://example.com/{i}", f"文章 {i}", "", ""] for i in range(ROWS)])
+    def update(self, **kwargs): return _Request(self, "update", kwargs)
+    def batchUpdate(self, **kwargs): return _Request(self, "batchUpdate", kwargs)
+
+def legacy_mark(service, row_ids_str):
+    """原本的寫法 (逐列 update)。"""
+    row_ids = [int(x.strip()) for x in row_ids_str.split(',') if x.strip().isdigit()]
+    for row_id in row_ids:
+        service.spreadsheets().values().update(
+            spreadsheetId=scraper.SPREADSHEET_ID, range=f"inbox!E{row_id}",
+            valueInputOption="USER_ENTERED", body={'values': [["Read"]]}
+        ).execute()
+
+def bench(label, func):
+    service = FakeSheetsService()
+    start = time.perf_counter()
+    func(service)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed * 1000:8.1f} ms  請求 {service.requests:3d} 次  標記 {service.cells} 列")
+    return elapsed
+
+if __name__ == "__main__":
+    ids = ", ".join(str(i) for i in range(2, ROWS + 2))
+    print(f"標記 {ROWS} 列 (每次往返 {ROUND_TRIP * 1000:.0f} ms)")
+    before = bench("逐列 update", lambda svc: legacy_mark(svc, ids))
+
+    scraper.sheets_cache.get_records(FakeSheetsService(), "inbox")
+
+    def batched(service):
+        scraper.get_google_service = lambda *args: service
+        print("  ", scraper.mark_inbox_as_read(f"2-{ROWS + 1}"))
+    after = bench("batchUpdate", batched)
+    print(f"約快 {before / after:.0f} 倍")
@@ -0,0 +1,51 @@
+# benchmarks/bench_renderer.py
+"""
+比較原本 handle_message 內的 re.sub + 六次 str.replace 與 telegram_render 的效能，
+並量測長回覆 (read_sheet_data 摘要) 的分段時間。
+- 一般：只有粗體、項目符號、<br>、& 與圖片標籤 (只有整段的 re.sub / str.replace)
+- 含標籤：每列另有 <i>...</i> (另需逐一配對標籤)
+輸出是否為合法的 Telegram HTML 見 check_renderer.py。
+
+執行方式 (專案根目錄)：python benchmarks/bench_renderer.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.telegram_render import render_reply, split_html
+
+def legacy_format(ai_reply):
+    """原本的格式轉換 (不跳脫 < &，也不處理長度上限)"""
+    ai_reply = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', ai_reply)
+    ai_reply = ai_reply.replace("- ", "• ")
+    ai_reply = ai_reply.replace("```html", "").replace("```", "")
+    ai_reply = ai_reply.replace("<br>", "\n").replace("<ul>", "").replace("</ul>", "").replace("<li>", "• ").replace("</li>", "")
+    img_match = re.search(r'<<<IMG:(.*?)>>>', ai_reply)
+    if img_match:
+        ai_reply = ai_reply.replace(img_match.group(0), "").strip()
+    return ai_reply
+
+def make_reply(rows, tags=False):
+    """模擬一份大型的健身動作庫摘要回覆"""
+    lines = ["**【資料庫讀取：training】**", "格式：[肌群] 動作名稱 (強度:/10) : 注意事項"]
+    note = "<i>肩胛後收</i>" if tags else "肩胛後收"
+    for i in range(rows):
+        lines.append(f"- [胸] 啞鈴臥推 {i} (強度:{i % 10}/10) : {note} & 下壓，**避免聳肩** <br>")
+    lines.append("<<<IMG:https://drive.google.com/file/d/abc/view>>>")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    for tags in (False, True):
+        print("含標籤" if tags else "一般")
+        for rows in (50, 500, 5000):
+            text = make_reply(rows, tags)
+            n = max(1, 2000 // rows)
+            legacy = timeit.timeit(lambda: legacy_format(text), number=n) / n * 1000
+            render = timeit.timeit(lambda: render_reply(text), number=n) / n * 1000
+            html, _ = render_reply(text)
+            split = timeit.timeit(lambda: split_html(html), number=n) / n * 1000
+            parts = split_html(html)
+            print(f"{rows:>5} 列 ({len(text):>7} 字): 舊版 {legacy:7.3f} ms | render_reply {render:7.3f} ms | 分段 {split:7.3f} ms -> {len(parts)} 則")
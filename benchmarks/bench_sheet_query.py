@@ -0,0 +1,93 @@
+# benchmarks/bench_sheet_query.py
+"""
+比較 read_sheet_data 在 10,000 列的合成訓練紀錄 / 健康紀錄上的回應大小與格式化時間：
+- 全部：不帶參數 (原本的行為，整張表轉成文字交給模型)
+- 篩選：last_n、日期範圍、肌群、欄位子集
+並比較兩種讀取路徑：
+- 快取：SheetsCache 的紀錄在記憶體中篩選 (鏡像停用時；快取已暖機)
+- 鏡像：有篩選條件時由 SheetsMirror (快取紀錄的 SQLite 索引) 查詢；不帶參數的整張表仍讀取快取
+資料由假的 Sheets Service 提供，不會連線 Google，只量測查詢 + 格式化的成本；
+實際讀取 Sheets 每次另需 200–800 ms 的 API 往返。
+
+執行方式 (專案根目錄)：python benchmarks/bench_sheet_query.py
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sheets_cache import SheetsCache
+from services.sheets_mirror import SheetsMirror
+from tools import health
+
+ROWS = 10_000
+REPEAT = 5
+MENUS = ["胸推 + 三頭", "深蹲 + 硬舉", "背部划船 + 二頭", "肩推 + 側平舉", "核心 + 有氧"]
+CONSTITUTIONS = ["平和", "氣虛", "陽虛", "陰虛", "痰濕"]
+
+def make_tables():
+    random.seed(42)
+    first_day = date.today() - timedelta(days=ROWS)
+    days = [(first_day + timedelta(days=i)).isoformat() for i in range(ROWS)]
+    workout = [["日期", "菜單", "RPE", "調整建議", "備註"]] + [
+        [d, random.choice(MENUS), str(random.randint(3, 10)), "強度適中", "組間休息 90 秒，最後一組力竭"]
+        for d in days
+    ]
+    health_rows = [["日期", "HP", "體質", "變化", "細節"]] + [
+        [d, str(random.randint(4, 10)), random.choice(CONSTITUTIONS), "無明顯變化", "睡眠 7 小時，午後略感疲倦"]
+        for d in days
+    ]
+    return {"workout_history": workout, "health_profile": health_rows}
+
+class _Request:
+    def __init__(self, result): self.result = result
+    def execute(self): return self.result
+
+class FakeSheetsService:
+    """只實作 values().get (回傳整張表)。"""
+    def __init__(self, tables): self.tables = tables
+    def spreadsheets(self): return self
+    def values(self): return self
+    def get(self, spreadsheetId, range):
+        return _Request({"values": self.tables.get(range.split("!")[0], [])})
+
+def main():
+    tables = make_tables()
+    service = FakeSheetsService(tables)
+    health.get_google_service = lambda *args: service
+    health.sheets_cache = SheetsCache()
+
+    # 鏡像的資料來自同一個快取；第一次查詢時載入 (量測取最快的一次，不含載入)
+    mirror = SheetsMirror(cache=health.sheets_cache)
+    disabled = SheetsMirror(enabled=False)
+
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    cases = [
+        ("workout_history", "全部", {}),
+        ("workout_history", "last_n=10", {"last_n": 10}),
+        ("workout_history", "近 30 天", {"start_date": month_ago}),
+        ("workout_history", "肌群=深蹲, last_n=5", {"muscle_group": "深蹲", "last_n": 5}),
+        ("workout_history", "last_n=30, 日期,RPE", {"last_n": 30, "columns": "日期,RPE"}),
+        ("health_profile", "全部", {}),
+        ("health_profile", "last_n=5", {"last_n": 5}),
+    ]
+
+    def best_ms(sheet, params):
+        return min(timeit.repeat(lambda: health.read_sheet_data(sheet, **params), number=1, repeat=REPEAT)) * 1000
+
+    print(f"{ROWS:,} 列合成資料，每種查詢取 {REPEAT} 次中最快的一次")
+    print(f"{'頁籤':<16} {'查詢':<22} {'字元數':>10} {'UTF-8 KB':>10} {'快取 ms':>9} {'鏡像 ms':>9}")
+    for sheet, label, params in cases:
+        health.sheets_mirror = disabled
+        text = health.read_sheet_data(sheet, **params)
+        cache_ms = best_ms(sheet, params)
+        health.sheets_mirror = mirror
+        assert health.read_sheet_data(sheet, **params) == text, "鏡像與快取的結果不同"
+        mirror_ms = best_ms(sheet, params)
+        print(f"{sheet:<16} {label:<22} {len(text):>10,} {len(text.encode()) / 1024:>10.1f} {cache_ms:>9.2f} {mirror_ms:>9.2f}")
+
+if __name__ == "__main__":
+    main()
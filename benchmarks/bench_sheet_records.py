@@ -0,0 +1,129 @@
+# benchmarks/bench_sheet_records.py
+"""
+大型頁籤的資料列解析與格式化吞吐量 (列/秒)：
+- 舊作法：每列 while len(row) < N: row.append("") 補齊後，以 row[0], row[1]... 組成文字
+- 紀錄：sheet_records.parse_rows 轉為 NamedTuple，再以 read_sheet_data 的格式組成文字
+- 快取命中：read_sheet_data 整張表的讀取路徑 (SheetsCache.get_records 沿用已解析的紀錄，只需格式化)
+另以 tracemalloc 量測每列常駐的記憶體 (list vs NamedTuple)。
+資料為合成的訓練紀錄 / 健康紀錄 / 食譜，約 1/3 的列省略尾端空欄 (與 Sheets API 的回傳相同)。
+
+執行方式 (專案根目錄)：python benchmarks/bench_sheet_records.py [列數]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sheet_records import COLUMN_LABELS, parse_rows
+from services.sheets_cache import SheetsCache
+from tools.health import _SHEET_FORMATS, _img_info
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+REPEAT = 5
+TABS = ["workout_history", "health_profile", "recipes"]
+
+# 舊版 read_sheet_data 的補齊欄數與格式
+def _legacy_workout(row):
+    while len(row) < 5: row.append("")
+    return f"- {row[0]}: {row[1]} (RPE:{row[2]}) | 建議:{row[3]}"
+
+def _legacy_health(row):
+    while len(row) < 5: row.append("")
+    return f"- {row[0]} | HP:{row[1]} | 體質:{row[2]} | 變化:{row[3]} | 細節:{row[4]}"
+
+def _legacy_recipe(row):
+    while len(row) < 6: row.append("")
+    return f"- {row[0]} ({row[1]} / {row[2]} / {row[3]}) - {row[4]} | {_img_info(row[5])}"
+
+LEGACY_FORMATS = {"workout_history": _legacy_workout, "health_profile": _legacy_health, "recipes": _legacy_recipe}
+
+def make_row(tab, day, i):
+    if tab == "workout_history":
+        row = [day, random.choice(["胸推 + 三頭", "深蹲 + 硬舉", "背部划船"]), str(random.randint(3, 10)), "強度適中", "組間休息 90 秒"]
+    elif tab == "health_profile":
+        row = [day, str(random.randint(4, 10)), random.choice(["平和", "氣虛", "陰虛"]), "無明顯變化", "睡眠 7 小時"]
+    else:
+        row = [f"料理 {i}", "雞肉", random.choice(["春", "夏", "秋", "冬"]), "家常", f"https://example.com/r/{i}", "", "少油"]
+    if i % 3 == 0:
+        # Sheets API 不回傳尾端的空欄
+        while row and row[-1] == "": row.pop()
+        row = row[:random.randint(2, len(row))]
+    return row
+
+def make_tables():
+    random.seed(7)
+    first_day = date.today() - timedelta(days=ROWS)
+    tables = {}
+    for tab in TABS:
+        header = COLUMN_LABELS[tab]
+        tables[tab] = [header] + [make_row(tab, (first_day + timedelta(days=i)).isoformat(), i) for i in range(ROWS)]
+    return tables
+
+class _Request:
+    def __init__(self, result): self.result = result
+    def execute(self): return self.result
+
+class FakeSheetsService:
+    """只實作 values().get (回傳整張表)。"""
+    def __init__(self, tables): self.tables = tables
+    def spreadsheets(self): return self
+    def values(self): return self
+    def get(self, spreadsheetId, range):
+        return _Request({"values": self.tables.get(range.split("!")[0], [])})
+
+def best_seconds(run, prepare=lambda: None):
+    """prepare() 的結果傳給 run()，不計入時間。"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        arg = prepare()
+        start = time.perf_counter()
+        run(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def resident_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size
+
+def main():
+    tables = make_tables()
+    service = FakeSheetsService(tables)
+    cache = SheetsCache()
+
+    print(f"每個頁籤 {ROWS:,} 列，取 {REPEAT} 次中最快的一次 (單位：千列/秒)")
+    print(f"{'頁籤':<16} {'舊作法 補齊+格式':>16} {'紀錄 解析':>10} {'紀錄 格式':>10} "
+          f"{'紀錄 解析+格式':>14} {'快取命中':>10} {'list B/列':>10} {'紀錄 B/列':>10}")
+    for tab in TABS:
+        data = tables[tab][1:]
+        legacy_format = LEGACY_FORMATS[tab]
+        format_records = _SHEET_FORMATS[tab][1]
+        records = parse_rows(tab, data)
+        # 舊作法會就地修改資料列，每次以新的複本量測 (與每次重新讀取 API 相同)
+        assert [legacy_format(list(r)) for r in data] == format_records(records), "格式化結果不同"
+        assert cache.get_records(service, tab) == records, "快取與解析結果不同"
+
+        legacy = best_seconds(lambda rows: [legacy_format(r) for r in rows], lambda: [list(r) for r in data])
+        parse = best_seconds(lambda _: parse_rows(tab, data))
+        fmt = best_seconds(lambda _: format_records(records))
+        both = best_seconds(lambda _: format_records(parse_rows(tab, data)))
+        cached = best_seconds(lambda _: format_records(cache.get_records(service, tab)))
+
+        width = len(COLUMN_LABELS[tab])
+        list_bytes = resident_bytes(lambda: [(r + [""] * width)[:width] for r in data]) / ROWS
+        record_bytes = resident_bytes(lambda: parse_rows(tab, data)) / ROWS
+
+        rate = lambda seconds: f"{ROWS / seconds / 1000:,.0f}"
+        print(f"{tab:<16} {rate(legacy):>16} {rate(parse):>10} {rate(fmt):>10} "
+              f"{rate(both):>14} {rate(cached):>10} {list_bytes:>10.0f} {record_bytes:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/check_renderer.py
+"""
+以隨機組合的回覆片段檢查 telegram_render 的輸出都是 Telegram 可接受的 HTML：
+- 只有 Telegram 支援的標籤，且正確巢狀、全部關閉 (連結只有 href 屬性)
+- 實體只有 &lt; &gt; &amp; &quot; 與數字實體，沒有單獨的 < > &
+- 圖片標籤全部移除，不殘留轉換用的佔位字元
+- split_html 的每一段都是合法的 HTML，且不超過長度上限
+  (巢狀標籤本身就超過上限時無法切得更短，不檢查長度)
+發現不合法的輸出時印出原始回覆並以非 0 結束。
+
+執行方式 (專案根目錄)：python benchmarks/check_renderer.py [回覆數]
+"""
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.telegram_render import render_reply, split_html
+
+CASES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+SPLIT_LIMIT = 40
+
+TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "code", "pre", "tg-spoiler", "blockquote", "a"}
+PIECES = [
+    "**", "*", "<i>", "</i>", "<b>", "</b>", "<I>", "</I>", "<code>", "</code>", "<pre>", "</pre>",
+    "<tg-spoiler>", "</tg-spoiler>", "<span>", "</div>",
+    '<a href="http://x/y">', '<a href="u**v w`">', '<A HREF="a&b">', "</a>", "<a>",
+    "<br>", "<br/>", "<ul>", "</ul>", "<li>", "</li>", "```", "```html", "`",
+    "&", "&amp;", "&lt;", "&quot;", "&nbsp;", "&LT;", "R&D;", "&#39;", "&#x27;", "&#xZZ;",
+    "<<<IMG:http://img/1>>>", "<<<IMG:a*b>>>", "<<<", ">>>", "IMG:",
+    "- ", "-", " ", "\n", "a", "中文", "<", ">", "\x01", "\x04",
+]
+
+_HTML_RE = re.compile(r"<(/?)([a-z-]+)((?: href=\"[^\"<>]*\")?)>|&(?:lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);|([<>&])")
+
+def problems(html):
+    """Telegram HTML 的問題清單 (空 list 表示合法)。"""
+    return _scan(html)[0]
+
+def tag_overhead(html):
+    """巢狀最深處，開啟中的標籤加上對應結尾標籤的總長度 (分段時每段都要重複這些標籤)。"""
+    return _scan(html)[1]
+
+def _scan(html):
+    found, stack, overhead, deepest = [], [], 0, 0
+    if any(c in html for c in "\x01\x02\x03\x04\x05"): found.append("佔位字元")
+    if "<<<IMG:" in html: found.append("圖片標籤")
+    for m in _HTML_RE.finditer(html):
+        close, name, attrs, stray = m.groups()
+        if stray:
+            found.append(f"單獨的 {stray}")
+        elif name is None:
+            continue
+        elif name not in TAGS or (attrs and name != "a") or (name == "a" and not close and not attrs):
+            found.append(f"標籤 {m[0]}")
+        elif not close:
+            stack.append((name, len(m[0]) + len(name) + 3))
+            overhead += stack[-1][1]
+            deepest = max(deepest, overhead)
+        elif not stack or stack[-1][0] != name:
+            found.append(f"未配對的 {m[0]}")
+        else:
+            overhead -= stack.pop()[1]
+    if stack: found.append(f"未關閉 {[name for name, _ in stack]}")
+    return found, deepest
+
+def main():
+    random.seed(7)
+    bad = 0
+    for _ in range(CASES):
+        text = "".join(random.choice(PIECES) for _ in range(random.randint(1, 16)))
+        html, _ = render_reply(text)
+        issues = problems(html)
+        check_length = tag_overhead(html) < SPLIT_LIMIT // 2
+        for chunk in split_html(html, SPLIT_LIMIT) if not issues else []:
+            if check_length and len(chunk) > SPLIT_LIMIT: issues.append(f"分段超過 {SPLIT_LIMIT} 字: {chunk!r}")
+            issues += [f"分段 {chunk!r}: {issue}" for issue in problems(chunk)]
+        if issues:
+            bad += 1
+            if bad <= 10: print(f"{text!r}\n  -> {html!r}\n  {issues}")
+    print(f"{CASES:,} 則回覆，{bad} 則不合法")
+    sys.exit(1 if bad else 0)
+
+if __name__ == "__main__":
+    main()
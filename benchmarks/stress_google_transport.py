@@ -0,0 +1,121 @@
+# benchmarks/stress_google_transport.py
+"""
+Google API 傳輸層的並行壓力測試 (不會連線 Google)。
+在本機啟動一個模擬 Sheets API 的 HTTP 伺服器 (回傳請求的 range)，
+讓多個執行緒同時呼叫 values().get，檢查：
+- 每個回應都對應到自己的請求 (沒有串線)
+- 錯誤數、伺服器端看到的 TCP 連線數 (連線池重用)
+
+比較對象：
+- requests：所有執行緒共用同一個 Client (services.google_transport.RequestsHttp，預設傳輸層)
+- httplib2：原本的作法，每個執行緒各自建立 Client (httplib2 不是執行緒安全的，無法共用)
+
+執行方式 (專案根目錄)：python benchmarks/stress_google_transport.py [執行緒數] [每執行緒請求數]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google_auth_httplib2
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from services.google_transport import RequestsHttp
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+REQUESTS_PER_THREAD = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+SERVER_DELAY = 0.002   # 模擬伺服器處理時間 (秒)
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    connections = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.connections.add(self.client_address)
+        # /v4/spreadsheets/<id>/values/<range>
+        range_name = unquote(urlsplit(self.path).path.rsplit("/values/", 1)[-1])
+        time.sleep(SERVER_DELAY)
+        body = json.dumps({"range": range_name, "values": [[range_name]]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # httplib2 對照組中斷連線時不印出堆疊
+
+def fake_credentials():
+    # Token 未設定到期時間，視為有效，不會嘗試更新
+    return Credentials(token="fake-access-token")
+
+def make_client(transport, endpoint):
+    options = {"api_endpoint": endpoint}
+    if transport == "requests":
+        http = RequestsHttp(fake_credentials())
+    else:
+        http = google_auth_httplib2.AuthorizedHttp(fake_credentials(), http=httplib2.Http(timeout=10))
+    return build("sheets", "v4", http=http, client_options=options,
+                 static_discovery=True, cache_discovery=False)
+
+def run(transport, endpoint):
+    FakeSheetsHandler.connections = set()
+    shared = make_client(transport, endpoint) if transport == "requests" else None
+    errors, mismatches = [], 0
+    counter_lock = threading.Lock()
+
+    def worker(thread_no):
+        nonlocal mismatches
+        service = shared or make_client(transport, endpoint)
+        # Resource 物件建立時會產生所有方法的說明文件 (CPU 成本高)，只建立一次
+        values_api = service.spreadsheets().values()
+        for i in range(REQUESTS_PER_THREAD):
+            range_name = f"T{thread_no}!A{i}"
+            try:
+                result = values_api.get(spreadsheetId="fake", range=range_name).execute()
+                if result.get("range") != range_name:
+                    with counter_lock: mismatches += 1
+            except Exception as e:
+                with counter_lock: errors.append(type(e).__name__)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(worker, range(THREADS)))
+    elapsed = time.perf_counter() - start
+
+    total = THREADS * REQUESTS_PER_THREAD
+    print(f"[{transport:8}] {total} 次請求 {elapsed:.2f} 秒 ({total / elapsed:.0f} req/s)｜"
+          f"錯誤 {len(errors)}｜串線 {mismatches}｜TCP 連線 {len(FakeSheetsHandler.connections)}")
+    if errors:
+        print(f"           錯誤類型: {sorted(set(errors))}")
+    return len(errors) + mismatches
+
+def main():
+    server = QuietServer(("127.0.0.1", 0), FakeSheetsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"{THREADS} 個執行緒 × 每執行緒 {REQUESTS_PER_THREAD} 次")
+
+    failures = run("requests", endpoint)
+    run("httplib2", endpoint)
+    server.shutdown()
+    # 預設傳輸層必須沒有錯誤與串線
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 # main.py
 import os
-import re
 import logging
 import asyncio
 from datetime import datetime
@@ -13,7 +12,23 @@ from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filte
 import google.generativeai as genai
 
 # 引入重構後的模組
-from services.gemini_ai import initialize_gemini
+from services.gemini_ai import initialize_gemini, get_model, send_message_with_tools
+from services.bot_runtime import BotRuntime
+from services.chat_runner import ChatRunner
+from services.message_queue import UserMessageQueue
+from services.session_store import SessionStore
+from services.session_backend import SQLiteSessionBackend
+from services.reply_stream import StreamingReply
+from services.telegram_render import render_reply, render_partial, split_html
+from services.routines import ROUTINES, run_routine
+from services.google_api import credential_manager
+from services.sheets_cache import sheets_cache
+from services.sheets_mirror import sheets_mirror
+from services.profile_index import profile_index
+from services.sheets_writer import sheets_writer
+from services.calendar_directory import calendar_directory
+from services import http_client
+from tools.todo_list import tasklist_resolver
 from tools import (
     add_calendar_event, update_user_profile, get_user_profile, read_sheet_data,
     add_todo_task, get_todo_tasks, log_workout_result, get_upcoming_events,
@@ -27,7 +42,9 @@ load_dotenv()
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-user_sessions = {}
+chat_runner = ChatRunner()
+# 串流回覆 (逐步編輯同一則訊息)；設為 0 則等完整回覆後才發送
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
 flask_app = Flask(__name__)
 
 # 定義工具列表 (供 Gemini 使用)
@@ -39,16 +56,11 @@ my_tools = [
     log_health_status, get_train_status
 ]
 
-# 初始化模型 (移至 services 處理)
-model = initialize_gemini(my_tools)
 
-def get_system_instruction():
-    now = datetime.now(ZoneInfo("Asia/Taipei"))
-    current_time_str = now.strftime("%Y-%m-%d %A %H:%M")
-    
-    instruction = f"""
+# 靜態系統指令 (只建立一次)；時間、節氣等動態資訊改由 get_turn_context() 附在每輪訊息前
+SYSTEM_INSTRUCTION = """
     你是一位高效的個人秘書、專業健身教練與中醫養生顧問。對於數據、事實性的回報講求精簡，對於建議與感性回覆則富有同理心與溫度。
-    現在時間是：{current_time_str} (UTC +8)
+    每則用戶訊息開頭的【目前時間】標頭為系統自動附加的即時資訊 (UTC +8)，請以此判斷日期與時間。
     
     【格式規範】
     - **格式**：**禁止使用 Markdown 語法**。有排版需求使用 `•` 或 `-`。
@@ -68,6 +80,8 @@ def get_system_instruction():
     - 查運動歷史紀錄 -> "workout_history"
     - 查食材屬性/忌口 -> "food_properties"
     - 查食譜 -> "recipes"
+    只需部分資料時請帶入篩選參數，避免讀取整張表：`last_n` (最後 N 筆)、`start_date` / `end_date` (YYYY-MM-DD)、
+    `muscle_group` (training / workout_history)、`season` (recipes)、`columns` (欄位，逗號分隔)。
     
     呼叫待辦清單 `add_todo_task` 或 `get_todo_tasks` 時，`list_name` 參數**僅限**使用以下字串，嚴禁自行創造：
     - 當日或兩日內應完成事項 -> "日常待辦"
@@ -86,8 +100,8 @@ def get_system_instruction():
 
     2. **健身與運動 (Fitness Coaching)**
        - **安排運動**：
-         (1) 檢查恢復：呼叫 `read_sheet_data("workout_history")` 確認上次訓練日與部位。
-         (2) 檢查體質：呼叫 `read_sheet_data("health_profile")` 若 HP<6 或氣虛，建議輕度運動。
+         (1) 檢查恢復：呼叫 `read_sheet_data("workout_history", last_n=10)` 確認上次訓練日與部位。
+         (2) 檢查體質：呼叫 `read_sheet_data("health_profile", last_n=5)` 若 HP<6 或氣虛，建議輕度運動。
          (3) 檢查作息：呼叫 `get_user_profile(domain="Routine")` 確認平日上班與通勤時間，若晚間有行程則禁止安排運動。
          (4) 排程：避開上次部位，從 `read_sheet_data("training")` 依「強度」挑選動作，避開上班與通勤時間，呼叫 `add_calendar_event` 寫入行事曆。
        - **結算運動**：
@@ -96,9 +110,9 @@ def get_system_instruction():
 
     3. **飲食與養生 (Diet & TCM)**
        - 用戶問「吃什麼」、「食譜」：
-         (1) 呼叫 `get_user_profile`, `get_current_solar_term` 與 `read_sheet_data("health_profile")` 確認習慣、節氣與健康狀況。
+         (1) 呼叫 `get_user_profile`, `get_current_solar_term` 與 `read_sheet_data("health_profile", last_n=5)` 確認習慣、節氣與健康狀況。
          (2) 呼叫 `read_sheet_data("food_properties")` 排除忌口食材。
-         (3) 呼叫 `read_sheet_data("recipes")` 推薦適合食譜。
+         (3) 呼叫 `read_sheet_data("recipes", season=目前季節)` 推薦適合食譜。
 
     4. **健康狀況紀錄 (Diagnosis)**
        - 用戶說：「不舒服」、「紀錄身體」。
@@ -112,7 +126,24 @@ def get_system_instruction():
        - 用戶問「列車動態」、「火車誤點」、「台北到鶯歌的列車」。
        - 動作：呼叫 `get_train_status(mode="check", dep="出發站名", arr="抵達站名")`。工具已整理好資訊，以完整格式回傳。查詢站名務必簡化為兩字，未指定則預設呼叫 `get_train_status(mode="check")`。
     """
-    return instruction
+
+def get_turn_context():
+    """每輪對話附加的動態標頭 (時間與節氣)，僅數十字。"""
+    now = datetime.now(ZoneInfo("Asia/Taipei"))
+    current_time_str = now.strftime("%Y-%m-%d %A %H:%M")
+    solar_term = get_current_solar_term().split("\n")[0]
+    return f"【目前時間】{current_time_str}｜{solar_term}"
+
+# 初始化模型 (移至 services 處理)：靜態系統指令與工具定義可行時放入 Context Cache
+initialize_gemini(my_tools, SYSTEM_INSTRUCTION)
+
+def _start_chat(history):
+    """以指定的歷史建立 ChatSession (新對話或從 backend 還原時使用)；工具呼叫由 send_message_with_tools 處理。"""
+    return get_model().start_chat(history=history)
+
+# 有上限的 Session 儲存區 (LRU + 閒置 TTL + 歷史預算)，以 SQLite 持久化 (冷啟動後只載入需要的 Session)
+# 系統指令不在歷史中，因此修剪時不需保留開頭
+user_sessions = SessionStore(backend=SQLiteSessionBackend(), session_factory=_start_chat, keep_head=0)
 
 def convert_drive_link(url):
     """
@@ -130,55 +161,80 @@ def convert_drive_link(url):
             return url # 解析失敗則回傳原網址試試看
     return url
 
+def _chat_turn(user_id, user_input, on_text=None):
+    """
+    (於工作執行緒執行) 取得或建立 Session 並送出訊息。
+    send_message 與其觸發的工具呼叫皆為同步阻塞，因此不可在 Event Loop 上直接執行。
+    指定 on_text 時以串流模式執行，並回傳完整文字。
+    """
+    # Session 管理
+    chat_session = user_sessions.get(user_id)
+    if chat_session is None:
+        print(f"User {user_id}: 建立新對話 Session", flush=True)
+        chat_session = _start_chat([])
+        user_sessions.put(user_id, chat_session)
+    # 使用最新的模型 (Context Cache 可能已延長或重建)
+    chat_session.model = get_model()
+
+    # 發送給 Gemini (附上本輪的時間標頭)
+    message = f"{get_turn_context()}\n{user_input}"
+    ai_reply = send_message_with_tools(chat_session, message, on_text)
+    # 歷史超過預算時刪除最舊的輪次，並將本輪新增的歷史寫入 SQLite
+    user_sessions.commit(user_id)
+    return ai_reply
+
+async def _flush_sheet_writes():
+    """
+    回覆送出後、請求結束前送出 Sheets 寫入佇列 (工具已回報寫入成功)。
+    Cloud Run 在回應後限制 CPU，不能只靠 SheetsWriter 的背景執行緒。
+    """
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, sheets_writer.flush_pending):
+        logger.warning("Sheets 寫入佇列未能全部送出，保留於 Journal 稍後重試")
+
 # --- Telegram 處理邏輯 ---
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text
     user_id = update.effective_user.id
     logger.info(f"User ({user_id}): {user_input}")
 
+    # 顯示 "打字中..." 狀態 (立即回饋，不等合併視窗)
     try:
-        # 顯示 "打字中..." 狀態
         await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
-        system_prompt = get_system_instruction()
-
-        # Session 管理
-        if user_id not in user_sessions:
-            print(f"User {user_id}: 建立新對話 Session", flush=True)
-            chat_session = model.start_chat(
-                history=[
-                    {"role": "user", "parts": [system_prompt]},
-                    {"role": "model", "parts": ["收到，我已準備好執行您的個人助理任務。"]} 
-                ],
-                enable_automatic_function_calling=True 
-            )
-            user_sessions[user_id] = chat_session
+    except Exception as e:
+        logger.warning(f"無法顯示打字狀態: {e}")
+
+    # 放入該用戶的佇列：同一用戶依序處理，短時間內的連續訊息合併成一次對話
+    await message_queue.submit(user_id, (update, context))
+
+async def _process_messages(user_id, items):
+    """(佇列 worker) 合併同一批訊息，執行一次 Gemini 對話並回覆最後一則訊息。"""
+    update, context = items[-1]
+    user_input = "\n".join(u.message.text for u, _ in items)
+    if len(items) > 1:
+        logger.info(f"User ({user_id}): 合併 {len(items)} 則訊息為一次對話")
+
+    stream = None
+    try:
+        # 交由執行緒池執行 (不阻塞其他用戶)，同一用戶依序處理
+        if STREAM_REPLIES:
+            # 串流模式：邊生成邊以節流方式編輯同一則訊息
+            stream = StreamingReply(update.message, render_partial)
+            ai_reply = await chat_runner.run(user_id, _chat_turn, user_id, user_input, stream.push)
         else:
-            chat_session = user_sessions[user_id]
+            ai_reply = await chat_runner.run(user_id, _chat_turn, user_id, user_input)
 
-        # 發送給 Gemini
-        response = chat_session.send_message(user_input)
-        ai_reply = response.text
-        
-        # 格式轉換 (Markdown -> HTML)
-        ai_reply = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', ai_reply)
-        ai_reply = ai_reply.replace("- ", "• ")
-        ai_reply = ai_reply.replace("```html", "").replace("```", "")
-        ai_reply = ai_reply.replace("<br>", "\n").replace("<ul>", "").replace("</ul>", "").replace("<li>", "• ").replace("</li>", "")
-
-        # 檢查是否有圖片標籤 <<<IMG:url>>>
-        image_url = None
-        # 使用 Regex 抓取標籤
-        img_match = re.search(r'<<<IMG:(.*?)>>>', ai_reply)
-        
-        if img_match:
-            raw_url = img_match.group(1).strip()
-            # 轉換 Google Drive 連結
-            image_url = convert_drive_link(raw_url)
-            # 將標籤從文字回應中移除，避免使用者看到一串網址
-            ai_reply = ai_reply.replace(img_match.group(0), "").strip()
+        # 格式轉換 (Markdown -> Telegram HTML) 並取出圖片標籤 <<<IMG:url>>>
+        ai_reply, image_url = render_reply(ai_reply)
+        # 轉換 Google Drive 連結
+        if image_url: image_url = convert_drive_link(image_url)
         
-        # 發送回覆
-        await update.message.reply_text(ai_reply, parse_mode=ParseMode.HTML)
+        # 發送回覆 (超過 4096 字時依序分段發送)
+        if stream:
+            await stream.finish(ai_reply)
+        if not stream or stream.sent is None:
+            for part in split_html(ai_reply):
+                await update.message.reply_text(part, parse_mode=ParseMode.HTML)
         # 如果有抓到圖片，隨後發送圖片
         if image_url:
             try:
@@ -193,7 +249,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # 1. 先詳細紀錄最原始的錯誤原因 (這才是我們最想知道的)
         logger.error(f"❌ 處理訊息時發生錯誤 (Original Error): {e}", exc_info=True)
         
-        if user_id in user_sessions: del user_sessions[user_id]
+        user_sessions.pop(user_id)
+        if stream: await stream.cancel()
         
         # 2. 嘗試發送錯誤訊息給用戶 (加一層保護，避免網路連線失敗導致二次崩潰)
         try:
@@ -201,102 +258,165 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception as send_error:
             # 如果連錯誤訊息都送不出去 (例如網路斷了)，就只寫 Log，不要讓程式崩潰
             logger.error(f"⚠️ 無法發送錯誤通知 (Network/Send Error): {send_error}")
+    finally:
+        # 出錯前的工具呼叫可能已排入寫入
+        await _flush_sheet_writes()
+
 
+# 每位用戶一條訊息佇列 (合併連續訊息、跨用戶平行處理)
+message_queue = UserMessageQueue(process=_process_messages)
 
 # --- 初始化 Telegram App ---
 token = os.getenv("TELEGRAM_BOT_TOKEN")
 if not token: raise ValueError("TELEGRAM_BOT_TOKEN 未設定！")
 
-ptb_app = ApplicationBuilder().token(token).build()
+# 連線池大小：Webhook 模式下所有請求共用同一個 HTTPX Client
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 32))
+
+ptb_app = (
+    ApplicationBuilder()
+    .token(token)
+    .connection_pool_size(TELEGRAM_POOL_SIZE)
+    .pool_timeout(10)
+    .concurrent_updates(True) # Polling 模式下允許不同用戶的訊息同時處理
+    .build()
+)
 ptb_app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
 
+# Webhook 模式：常駐 Event Loop + 只初始化一次的 ptb_app
+bot_runtime = BotRuntime(ptb_app)
+
 # --- Flask 路由設定 ---
 
 @flask_app.route('/', methods=['GET'])
 def index():
     return "Gemini Bot is Alive!"
 
+def _is_authorized():
+    """簡單的資安驗證 (沿用 Gemini Key 當作驗證碼)"""
+    return request.headers.get("X-API-KEY") == os.getenv("GEMINI_API_KEY")
+
+# 0. 執行狀態 (Session 數量與記憶體使用、佇列、Google 憑證、Sheets / 日曆 / 待辦清單快取、HTTP 連線池)
+@flask_app.route('/stats', methods=['GET'])
+def stats():
+    if not _is_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({
+        "sessions": user_sessions.stats(),
+        "queue": message_queue.stats(),
+        "google_credentials": credential_manager.stats(),
+        "sheets_cache": sheets_cache.stats(),
+        "sheets_writer": sheets_writer.stats(),
+        "sheets_mirror": sheets_mirror.stats(),
+        "user_profile": profile_index.stats(),
+        "calendar_directory": calendar_directory.stats(),
+        "tasklists": tasklist_resolver.stats(),
+        "http": http_client.stats(),
+    })
+
 # 1. Telegram Webhook 入口
 @flask_app.route(f'/{token}', methods=['POST'])
-async def telegram_webhook():
+def telegram_webhook():
     """接收 Telegram 傳來的更新"""
     try:
-        # 每次請求都重新初始化，綁定當下的 Event Loop
-        if not ptb_app._initialized:
-            await ptb_app.initialize()
-
         update = Update.de_json(request.get_json(force=True), ptb_app.bot)
-        await ptb_app.process_update(update)
+        # 丟到常駐 Event Loop 處理 (ptb_app 已初始化，不再重建連線)
+        bot_runtime.run(ptb_app.process_update(update))
     except Exception as e:
         logger.error(f"Webhook Error: {e}")
-    finally:
-        # 請求結束後關閉 App，釋放舊的 Event Loop
-        # 這樣下次請求時，就會重新 initialize 並綁定新的 Loop
-        if ptb_app._initialized:
-            await ptb_app.shutdown()
             
     return "OK"
 
 # 2. GitHub Actions 排程入口 (關鍵新增)
 @flask_app.route('/trigger_routine', methods=['POST'])
-async def trigger_routine():
+def trigger_routine():
     """
     接收 GitHub Actions 的定時呼叫。
-    Payload 格式: {"user_id": 123456789, "message": "[定時指令] 早安"}
+    Payload 格式: {"user_id": 123456789, "routine": "morning"}  (可加 "commentary": true/false 覆寫是否附加 AI 評論)
+    舊格式 {"user_id": 123456789, "message": "[定時指令] 早安"} 仍可使用 (交由 Gemini 處理)
     Header: {"X-API-KEY": "您的密鑰"}
     """
     # 簡單的資安驗證
-    api_key = request.headers.get("X-API-KEY")
-    server_key = os.getenv("GEMINI_API_KEY") # 為了方便，我們先借用 Gemini Key 當作驗證碼，您也可以另外設一個
-    if api_key != server_key:
+    if not _is_authorized():
         return jsonify({"error": "Unauthorized"}), 401
 
     data = request.get_json()
     target_user_id = data.get("user_id")
+    routine_name = data.get("routine")
     message_text = data.get("message")
 
-    if not target_user_id or not message_text:
+    if not target_user_id or not (routine_name or message_text):
         return jsonify({"error": "Missing params"}), 400
+    if routine_name and routine_name not in ROUTINES:
+        return jsonify({"error": f"Unknown routine: {routine_name}"}), 400
 
-    logger.info(f"收到排程觸發: User={target_user_id}, Msg={message_text}")
+    logger.info(f"收到排程觸發: User={target_user_id}, Routine={routine_name}, Msg={message_text}")
 
     try:
-        # 每次請求都重新初始化
-        if not ptb_app._initialized:
-            await ptb_app.initialize()
-
-        # 偽造 Update 物件
-        from telegram import User, Chat, Message
-        mock_user = User(id=target_user_id, first_name="Auto", is_bot=False)
-        mock_chat = Chat(id=target_user_id, type="private")
-        mock_message = Message(
-            message_id=0, 
-            date=datetime.now(), 
-            chat=mock_chat, 
-            from_user=mock_user, 
-            text=message_text
-        )
-        # 綁定 Bot
-        mock_message.set_bot(ptb_app.bot)
-        mock_update = Update(update_id=0, message=mock_message)
-        mock_update.set_bot(ptb_app.bot)
-
-        # 丟進 PTB 處理
-        await ptb_app.process_update(mock_update)
-        
+        if routine_name:
+            bot_runtime.run(_send_routine(target_user_id, routine_name, data.get("commentary")))
+        else:
+            bot_runtime.run(_process_routine_message(target_user_id, message_text))
     except Exception as e:
         logger.error(f"Trigger Error: {e}")
         return jsonify({"error": str(e)}), 500
+
+    return jsonify({"status": "Triggered", "routine": routine_name, "message": message_text})
+
+async def _send_routine(target_user_id, routine_name, commentary=None):
+    """
+    直接執行例行報告的工具並發送結果 (不經過 LLM)；需要評論時接著另外發送。
+    報告先送出，評論在同一個請求內完成：Cloud Run 在回應後會限制 CPU，不能留背景 Task。
+    """
+    text = await run_routine(routine_name)
+    html, _ = render_reply(text)
+    for part in split_html(html):
+        await ptb_app.bot.send_message(chat_id=target_user_id, text=part, parse_mode=ParseMode.HTML)
+
+    instruction = ROUTINES[routine_name]["commentary"]
+    if commentary is False or (commentary is None and not instruction): return
+    await _send_routine_commentary(target_user_id, text, instruction)
+
+async def _send_routine_commentary(target_user_id, routine_text, instruction=None):
+    """以報告內容請 Gemini 補充簡短評論 (同時讓後續對話能引用這份報告)。"""
+    prompt = (
+        f"以下是剛剛自動發送給我的排程報告：\n{routine_text}\n\n"
+        f"{instruction or '請用兩三句話給出今天的重點提醒，不要重複報告內容。'}"
+    )
+    try:
+        ai_reply = await chat_runner.run(target_user_id, _chat_turn, target_user_id, prompt)
+        html, _ = render_reply(ai_reply)
+        for part in split_html(html):
+            await ptb_app.bot.send_message(chat_id=target_user_id, text=part, parse_mode=ParseMode.HTML)
+    except Exception as e:
+        logger.error(f"例行報告評論失敗: {e}", exc_info=True)
     finally:
-        # 【關鍵修正】請求結束後關閉 App
-        if ptb_app._initialized:
-            await ptb_app.shutdown()
+        await _flush_sheet_writes()
+
+async def _process_routine_message(target_user_id, message_text):
+    """偽造 Update 物件並交給 PTB 處理 (於常駐 Event Loop 上執行)。"""
+    from telegram import User, Chat, Message
+    mock_user = User(id=target_user_id, first_name="Auto", is_bot=False)
+    mock_chat = Chat(id=target_user_id, type="private")
+    mock_message = Message(
+        message_id=0, 
+        date=datetime.now(), 
+        chat=mock_chat, 
+        from_user=mock_user, 
+        text=message_text
+    )
+    # 綁定 Bot
+    mock_message.set_bot(ptb_app.bot)
+    mock_update = Update(update_id=0, message=mock_message)
+    mock_update.set_bot(ptb_app.bot)
 
-    return jsonify({"status": "Triggered", "message": message_text})
+    # 丟進 PTB 處理
+    await ptb_app.process_update(mock_update)
 
 # --- 啟動伺服器 (加入本機啟動之polling模式) ---
 if __name__ == '__main__':
     import argparse
+    import signal
     import sys
 
     # 1. 設定參數解析器
@@ -357,7 +477,11 @@ if __name__ == '__main__':
             except Exception as e:
                 print(f"⚠️ 設定 Webhook 時發生錯誤: {e}")
 
+        # 預先初始化 ptb_app (常駐)，並在收到 SIGTERM (Cloud Run 回收) 時正常結束以觸發 shutdown
+        bot_runtime.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
         # 啟動 Flask
         # 注意：Cloud Run 環境通常會忽略 host 參數，但在本機測試若不想跳防火牆，
         # 這裡其實也可以改為 '127.0.0.1'，但為了雲端相容性，保持 '0.0.0.0' 即可
-        flask_app.run(host="0.0.0.0", port=port)
\ No newline at end of file
+        flask_app.run(host="0.0.0.0", port=port, threaded=True)
\ No newline at end of file
@@ -0,0 +1,71 @@
+# services/bot_runtime.py
+import asyncio
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class BotRuntime:
+    """
+    讓 python-telegram-bot 的 Application 在 Webhook 模式下常駐。
+    - 單一背景 Event Loop (獨立執行緒)，所有請求共用
+    - Application 只 initialize 一次，沿用同一個 HTTPX 連線池 (不再每次 getMe)
+    - 只在行程結束時 (atexit) 才 shutdown
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def start(self):
+        """啟動背景 Loop 並初始化 Application (重複呼叫無副作用)。"""
+        if self._loop is not None: return
+        with self._lock:
+            if self._loop is not None: return
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="ptb-event-loop", daemon=True)
+            thread.start()
+
+            # 初始化一次即可：建立 HTTPX Client 並呼叫 getMe
+            asyncio.run_coroutine_threadsafe(self.application.initialize(), loop).result()
+            logger.info("PTB Application 已初始化 (常駐 Event Loop)")
+
+            self._thread = thread
+            self._loop = loop
+            atexit.register(self.stop)
+
+    def run(self, coro, timeout=None):
+        """
+        在常駐 Loop 上執行 coroutine，並在呼叫端執行緒等待結果。
+        供 Flask (同步) 路由使用。
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(timeout)
+
+    def stop(self):
+        """關閉 Application 並停止背景 Loop (行程結束時呼叫)。"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None: return
+            self._loop = None
+            self._thread = None
+
+        try:
+            if self.application._initialized:
+                asyncio.run_coroutine_threadsafe(self.application.shutdown(), loop).result(timeout=10)
+            logger.info("PTB Application 已關閉")
+        except Exception as e:
+            logger.error(f"關閉 PTB Application 失敗: {e}")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
@@ -0,0 +1,131 @@
+# services/calendar_directory.py
+import os
+import re
+import threading
+import time
+import unicodedata
+from googleapiclient.errors import HttpError
+
+# 日曆清單幾乎不變：超過 TTL 才以 syncToken 增量同步 (秒)
+CALENDAR_DIRECTORY_TTL = int(os.getenv("CALENDAR_DIRECTORY_TTL", 3600))
+# 名稱查不到時最多多久同步一次 (秒)，避免不存在的名稱每次都觸發請求
+MISS_REFRESH_INTERVAL = 60
+
+_NORMALIZE_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_name(name: str) -> str:
+    """名稱正規化：全形轉半形 (NFKC)、忽略大小寫、移除空白與標點。"""
+    return _NORMALIZE_RE.sub("", unicodedata.normalize("NFKC", name or "")).casefold()
+
+class CalendarDirectory:
+    """
+    記憶體中的日曆目錄 (calendarList 快取)。
+    - 記錄每個日曆的名稱、selected / hidden 旗標，並建立「正規化名稱 -> ID」索引
+    - 超過 TTL 時以 syncToken 增量同步；syncToken 失效 (HTTP 410) 時重新完整同步
+    - 名稱查詢：正規化後完全相符優先，其次子字串相符
+    """
+
+    def __init__(self, ttl=CALENDAR_DIRECTORY_TTL):
+        self.ttl = ttl
+        self._calendars = {}    # id -> {"summary", "selected", "hidden", "primary"}
+        self._index = {}        # 正規化名稱 -> id
+        self._sync_token = None
+        self._synced_at = None
+        self._miss_refresh_at = 0.0
+        self._lock = threading.Lock()
+
+        self.hits = 0           # 不需呼叫 API 即完成的查詢
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+
+    # --- 同步 ---
+    def _list_all(self, service, **params):
+        """分頁讀取 calendarList；回傳 (items, nextSyncToken)。"""
+        items, page_token = [], None
+        while True:
+            result = service.calendarList().list(pageToken=page_token, **params).execute()
+            items.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return items, result.get('nextSyncToken')
+
+    def _apply(self, item):
+        if item.get('deleted'):
+            self._calendars.pop(item['id'], None)
+            return
+        self._calendars[item['id']] = {
+            "summary": item.get('summaryOverride') or item.get('summary', ''),
+            "selected": item.get('selected', False),
+            "hidden": item.get('hidden', False),
+            "primary": item.get('primary', False),
+        }
+
+    def _sync(self, service):
+        """(持有 _lock 時呼叫) 有 syncToken 則增量同步，否則完整同步。"""
+        if self._sync_token:
+            try:
+                items, token = self._list_all(service, syncToken=self._sync_token)
+                for item in items: self._apply(item)
+                self.incremental_syncs += 1
+            except HttpError as e:
+                if e.resp.status != 410: raise
+                # syncToken 已失效：重新完整同步
+                self._sync_token = None
+                return self._sync(service)
+        else:
+            items, token = self._list_all(service, showHidden=True)
+            self._calendars = {}
+            for item in items: self._apply(item)
+            self.full_syncs += 1
+
+        self._sync_token = token
+        self._synced_at = time.monotonic()
+        self._index = {normalize_name(c["summary"]): cal_id for cal_id, c in self._calendars.items()}
+
+    def _ensure_fresh(self, service):
+        if self._synced_at is None or time.monotonic() - self._synced_at > self.ttl:
+            self._sync(service)
+            return False
+        return True
+
+    # --- 查詢 ---
+    def _match(self, name):
+        key = normalize_name(name)
+        if not key: return None
+        if key in self._index: return self._index[key]
+        for summary_key, cal_id in self._index.items():
+            if key in summary_key: return cal_id
+        return None
+
+    def find_id(self, service, name: str):
+        """依名稱 (可為部分名稱) 找出日曆 ID；找不到回傳 None。"""
+        with self._lock:
+            fresh = self._ensure_fresh(service)
+            cal_id = self._match(name)
+            if cal_id is None and fresh and time.monotonic() - self._miss_refresh_at > MISS_REFRESH_INTERVAL:
+                # 可能是新建立的日曆：同步一次再查
+                self._miss_refresh_at = time.monotonic()
+                self._sync(service)
+                cal_id = self._match(name)
+            elif fresh:
+                self.hits += 1
+            return cal_id
+
+    def visible_calendars(self, service):
+        """有勾選顯示且未隱藏的日曆：[(id, 名稱)]。"""
+        with self._lock:
+            if self._ensure_fresh(service): self.hits += 1
+            return [(cal_id, c["summary"]) for cal_id, c in self._calendars.items()
+                    if c["selected"] and not c["hidden"]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calendars": len(self._calendars),
+                "hits": self.hits,
+                "full_syncs": self.full_syncs,
+                "incremental_syncs": self.incremental_syncs,
+            }
+
+# 全域共用的日曆目錄
+calendar_directory = CalendarDirectory()
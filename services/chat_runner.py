@@ -0,0 +1,38 @@
+# services/chat_runner.py
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 同時執行的 Gemini 對話上限 (含其觸發的工具呼叫)
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", 8))
+
+class ChatRunner:
+    """
+    將同步的 Gemini 對話 (send_message 與其觸發的工具呼叫) 移到有上限的執行緒池執行，
+    避免阻塞 Event Loop。
+    - 不同用戶：平行處理
+    - 同一用戶：以 asyncio.Lock 保證依序處理 (避免同一個 ChatSession 被同時寫入)
+    """
+
+    def __init__(self, max_workers: int = CHAT_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-turn")
+        self._locks = {}    # user_id -> asyncio.Lock
+        self._waiters = {}  # user_id -> 等待/執行中的數量 (歸零時移除 Lock，避免字典無限成長)
+
+    async def run(self, user_id, func, *args, **kwargs):
+        """於工作執行緒執行 func(*args, **kwargs)，同一 user_id 依到達順序執行。"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        try:
+            async with lock:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self._waiters[user_id] -= 1
+            if self._waiters[user_id] == 0:
+                del self._waiters[user_id]
+                del self._locks[user_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,153 @@
+# services/credentials.py
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+
+# Access Token 到期前多久於背景預先更新
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# 更新失敗後，這段時間內 (秒) 等待中的呼叫直接沿用同一個錯誤，不再各自重試
+REFRESH_FAILURE_HOLD = 10
+
+class _ManagedCredentials(Credentials):
+    """
+    交給 CredentialManager 更新的 Credentials。
+    API Client (AuthorizedSession / google_auth_httplib2) 遇到過期或 401 時會直接呼叫 refresh()，
+    這裡改為轉交 Manager，確保所有路徑都走同一個 single-flight 更新。
+    """
+    _manager = None
+
+    def refresh(self, request):
+        if self._manager is None:
+            return super().refresh(request)
+        self._manager.refresh(self)
+
+class CredentialManager:
+    """
+    Google OAuth 憑證管理 (常駐記憶體)。
+    - 同時只有一個更新在進行；其他呼叫等待並沿用其結果 (single-flight)
+    - 更新成功後以「暫存檔 + os.replace」原子性地寫回 token 檔，重啟後不必再更新一次
+    - 依 expiry 排程於到期前背景更新
+    """
+
+    def __init__(self, token_file, scopes):
+        self.token_file = token_file
+        self.scopes = scopes
+        self._creds = None
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # 持有者即為唯一在進行中的更新
+        self._attempts = 0                     # 更新嘗試次數 (等待者用來判斷期間是否有人嘗試過)
+        self._last_error = None
+        self._last_error_at = 0.0
+        self._timer = None
+
+        self.refreshes = 0       # 實際向 Google 更新的次數
+        self.coalesced = 0       # 等待並沿用其他執行緒更新結果的次數
+        self.persist_errors = 0
+
+    def _load(self):
+        if not os.path.exists(self.token_file): return None
+        creds = _ManagedCredentials.from_authorized_user_file(self.token_file, self.scopes)
+        creds._manager = self
+        return creds
+
+    def get(self):
+        """取得可用的憑證；過期則更新 (single-flight)。無法取得則回傳 None。"""
+        creds = self._creds
+        if creds is None:
+            with self._load_lock:
+                if self._creds is None:
+                    self._creds = self._load()
+                    if self._creds is not None and self._creds.valid: self._schedule(self._creds)
+                creds = self._creds
+        if creds is None:
+            print("警告：憑證不存在，請重新執行 setup_google.py")
+            return None
+        if creds.valid: return creds
+        if not creds.refresh_token:
+            print("警告：憑證已失效且無法更新，請重新執行 setup_google.py")
+            return None
+        try:
+            self.refresh(creds)
+            return creds
+        except Exception as e:
+            print(f"Token 更新失敗: {e}")
+            return None
+
+    def refresh(self, creds):
+        """
+        更新 Access Token；已有更新在進行時等待並沿用其結果 (成功或失敗)。
+        更新是原地修改同一個 Credentials 物件，因此所有已建立的 Client 立即生效。
+        """
+        seen_token, seen_attempts = creds.token, self._attempts
+        with self._refresh_lock:
+            # 等待期間已有其他執行緒完成更新：直接沿用新的 Token
+            if creds.token != seen_token and creds.valid:
+                self.coalesced += 1
+                return
+            # 等待期間的更新剛失敗：沿用同一個錯誤，避免接連重試
+            if (self._attempts != seen_attempts and self._last_error
+                    and time.monotonic() - self._last_error_at < REFRESH_FAILURE_HOLD):
+                self.coalesced += 1
+                raise self._last_error
+
+            self._attempts += 1
+            try:
+                print("正在更新 Google Access Token...", flush=True)
+                Credentials.refresh(creds, Request())
+            except Exception as e:
+                self._last_error, self._last_error_at = e, time.monotonic()
+                raise
+            self._last_error = None
+            self.refreshes += 1
+            self._persist(creds)
+            self._schedule(creds)
+
+    def _persist(self, creds):
+        """原子寫入 token 檔 (先寫同目錄的暫存檔再 os.replace，避免寫到一半被讀取或中斷)。"""
+        directory = os.path.dirname(os.path.abspath(self.token_file))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".json")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(creds.to_json())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.token_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            # 唯讀的檔案系統等情況：記憶體中的憑證仍可使用
+            self.persist_errors += 1
+            print(f"Token 寫回失敗 (僅保留於記憶體): {e}", flush=True)
+
+    def _schedule(self, creds):
+        """在到期前 TOKEN_REFRESH_MARGIN 於背景更新，避免工具呼叫當下才等待。"""
+        if self._timer is not None: self._timer.cancel()
+        if not creds.expiry or not creds.refresh_token: return
+        # google-auth 的 expiry 為 naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        delay = (creds.expiry - TOKEN_REFRESH_MARGIN - now).total_seconds()
+        self._timer = threading.Timer(max(delay, 0), self._background_refresh, args=(creds,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self, creds):
+        try:
+            self.refresh(creds)
+        except Exception as e:
+            print(f"背景更新 Token 失敗 (下次使用時重試): {e}", flush=True)
+
+    def stats(self):
+        creds = self._creds
+        return {
+            "loaded": creds is not None,
+            "expiry": creds.expiry.isoformat() + "Z" if creds is not None and creds.expiry else None,
+            "refreshes": self.refreshes,
+            "coalesced_refreshes": self.coalesced,
+            "persist_errors": self.persist_errors,
+        }
@@ -1,19 +1,171 @@
 # services/gemini_ai.py
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, timezone
 import google.generativeai as genai
+from google.generativeai import caching, protos
+from google.generativeai.types import content_types
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def initialize_gemini(tools_list):
+# 使用目前的 Flash 模型
+MODEL_NAME = 'gemini-3-flash-preview'
+
+# Context Caching：將「靜態系統指令 + 工具定義」存在 Gemini 端，之後的請求不再重複計費
+# 模型不支援或內容低於最低 Token 數時會自動退回一般模式
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_TTL = timedelta(minutes=int(os.getenv("GEMINI_CONTEXT_CACHE_MINUTES", 60)))
+# 快取剩餘時間低於此值時延長 TTL
+CONTEXT_CACHE_RENEW = timedelta(minutes=10)
+
+# 同一輪的多個工具呼叫平行執行；單一工具的逾時 (秒)，逾時則回傳錯誤給模型
+# (應大於 GOOGLE_HTTP_READ_TIMEOUT，逾時的 Google API 呼叫才會先結束並釋放 worker)
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", 8))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", 20))
+# 個別工具的逾時設定 (覆寫 TOOL_TIMEOUT)
+TOOL_TIMEOUTS = {
+    "scrape_web_content": 30,
+}
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="gemini-tool")
+
+_lock = threading.Lock()
+_state = {
+    "model": None,       # 目前使用的 GenerativeModel
+    "cache": None,       # CachedContent (未啟用則為 None)
+    "tools_lib": None,   # 工具的 FunctionLibrary (本地執行用)
+    "system_instruction": None,
+    "tools_list": None,
+}
+
+def initialize_gemini(tools_list, system_instruction=None):
     """
-    初始化 Gemini 模型並綁定工具。
+    初始化 Gemini 模型並綁定工具與系統指令。
+    系統指令只需建立一次；可行時連同工具定義放入 Context Cache。
     """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY 未設定！")
-    
+
     genai.configure(api_key=api_key)
-    # 使用目前的 Flash 模型
-    model = genai.GenerativeModel('gemini-3-flash-preview', tools=tools_list)
-    return model
\ No newline at end of file
+    with _lock:
+        _state["tools_list"] = tools_list
+        _state["system_instruction"] = system_instruction
+        _state["tools_lib"] = content_types.to_function_library(tools_list)
+        _state["model"] = _build_model()
+    return _state["model"]
+
+def _build_model():
+    """建立模型：優先使用 Context Cache，失敗則退回一般模型 (系統指令與工具隨每次請求送出)。"""
+    tools_list, system_instruction = _state["tools_list"], _state["system_instruction"]
+    if CONTEXT_CACHE_ENABLED and system_instruction:
+        try:
+            cache = caching.CachedContent.create(
+                model=f"models/{MODEL_NAME}",
+                display_name="gemini-bot-system",
+                system_instruction=system_instruction,
+                tools=tools_list,
+                ttl=CONTEXT_CACHE_TTL,
+            )
+            _state["cache"] = cache
+            print(f"Context Cache 已建立: {cache.name} (tokens={cache.usage_metadata.total_token_count})", flush=True)
+            # 快取模型本身不帶 tools (工具定義已在快取中)，工具改由 _state["tools_lib"] 在本地執行
+            return genai.GenerativeModel.from_cached_content(cache)
+        except Exception as e:
+            print(f"Context Cache 無法使用，改用一般模式: {e}", flush=True)
+    _state["cache"] = None
+    return genai.GenerativeModel(MODEL_NAME, tools=tools_list, system_instruction=system_instruction)
+
+def get_model():
+    """取得目前的模型；Context Cache 即將到期時延長 TTL，已失效則重建。"""
+    with _lock:
+        cache = _state["cache"]
+        if cache is not None:
+            remaining = cache.expire_time - datetime.now(timezone.utc)
+            if remaining < CONTEXT_CACHE_RENEW:
+                try:
+                    cache.update(ttl=CONTEXT_CACHE_TTL)
+                except Exception as e:
+                    print(f"Context Cache 延長失敗，重新建立: {e}", flush=True)
+                    _state["model"] = _build_model()
+        return _state["model"]
+
+def _function_error(name, message):
+    return protos.Part(function_response=protos.FunctionResponse(name=name, response={"result": message}))
+
+def _call_tool(fc):
+    """執行單一工具，任何錯誤都轉為 function_response 讓模型得知。"""
+    try:
+        return _state["tools_lib"](fc) or _function_error(fc.name, f"錯誤：未知的工具 '{fc.name}'")
+    except KeyError:
+        return _function_error(fc.name, f"錯誤：未知的工具 '{fc.name}'")
+    except Exception as e:
+        return _function_error(fc.name, f"工具執行失敗: {e}")
+
+def _execute_function_calls(function_calls):
+    """
+    執行模型要求的工具，依原順序回傳對應的 function_response parts。
+    同一回應中的多個工具平行執行，總延遲約等於最慢的一個 (而非全部相加)；
+    各工具的逾時從該工具開始執行時計算 (worker 都被佔用時，排隊的時間不算)，
+    逾時的工具回傳錯誤訊息 (背景執行緒仍會跑完，但結果不再使用)；
+    排隊超過一個逾時仍未開始的工具直接取消。
+    """
+    started = [None] * len(function_calls)
+
+    def run(index, fc):
+        started[index] = time.monotonic()
+        return _call_tool(fc)
+
+    submitted = time.monotonic()
+    futures = [_tool_executor.submit(run, i, fc) for i, fc in enumerate(function_calls)]
+    parts = []
+    for i, (fc, future) in enumerate(zip(function_calls, futures)):
+        timeout = TOOL_TIMEOUTS.get(fc.name, TOOL_TIMEOUT)
+        try:
+            parts.append(future.result(timeout=max(0, submitted + timeout - time.monotonic())))
+            continue
+        except FutureTimeout:
+            pass
+        if future.cancel():
+            print(f"工具排隊逾時: {fc.name} ({timeout}s)", flush=True)
+            parts.append(_function_error(fc.name, f"錯誤：系統忙碌，工具超過 {timeout:g} 秒仍未開始執行，請稍後再試或告知用戶。"))
+            continue
+        # 已在執行：從開始執行時起算 (run 剛開始時 started 可能尚未寫入)
+        start = started[i] or time.monotonic()
+        try:
+            parts.append(future.result(timeout=max(0, start + timeout - time.monotonic())))
+        except FutureTimeout:
+            print(f"工具逾時: {fc.name} ({timeout}s)", flush=True)
+            parts.append(_function_error(fc.name, f"錯誤：工具執行逾時 ({timeout:g} 秒)，請稍後再試或告知用戶。"))
+    return parts
+
+def send_message_with_tools(chat_session, content, on_text=None):
+    """
+    送出訊息並自行處理 Function Calling (取代 enable_automatic_function_calling)。
+    - 工具由本地的 FunctionLibrary 執行，因此使用 Context Cache (模型不帶 tools) 時也能運作
+    - 指定 on_text 時以串流方式執行，每收到一段文字就以「目前累積的完整文字」呼叫 on_text
+    回傳完整文字。
+    """
+    stream = on_text is not None
+    text = ""
+    while True:
+        response = chat_session.send_message(content, stream=stream)
+        if stream:
+            for chunk in response:
+                for part in chunk.parts:
+                    if part.text:
+                        text += part.text
+                        on_text(text)
+            response.resolve()
+        else:
+            text += "".join(part.text for part in response.parts if part.text)
+
+        function_calls = [part.function_call for part in response.parts if "function_call" in part]
+        if not function_calls:
+            return text
+
+        # 平行執行工具，並將所有結果在同一則訊息中回傳給模型
+        content = protos.Content(role="user", parts=_execute_function_calls(function_calls))
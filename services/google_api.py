@@ -1,9 +1,12 @@
 # services/google_api.py
 import os
+import threading
+import httplib2
 from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from services.credentials import CredentialManager
+from services.google_transport import GOOGLE_HTTP_TIMEOUT, RequestsHttp
 
 # 載入環境變數
 load_dotenv()
@@ -17,30 +20,64 @@ SCOPES = [
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 CWA_API_KEY = os.getenv("CWA_API_KEY")
 
+# 注意：這裡假設 token.json 在專案根目錄
+TOKEN_FILE = 'token.json'
+
+# 憑證只從磁碟讀取一次並常駐記憶體；更新為 single-flight 並寫回 token.json
+credential_manager = CredentialManager(TOKEN_FILE, SCOPES)
+
+# HTTP 傳輸層："requests" (預設，執行緒安全的連線池，所有執行緒共用 Client) 或 "httplib2" (每執行緒各自一組 Client)
+GOOGLE_API_TRANSPORT = os.getenv("GOOGLE_API_TRANSPORT", "requests")
+
+# Client 快取 {(服務, 版本): Client}
+_clients = {}
+_clients_lock = threading.Lock()
+_http = None
+# httplib2 不是執行緒安全的，使用 httplib2 時每個執行緒各自保留一組
+_local = threading.local()
+
+def get_credentials():
+    """取得常駐記憶體的憑證 (必要時更新)；無法取得則回傳 None。"""
+    return credential_manager.get()
+
+def _build(service_name, version, creds):
+    """建立 Client (使用內建的靜態 Discovery 文件)。"""
+    global _http
+    if GOOGLE_API_TRANSPORT == "httplib2":
+        # 與 requests 傳輸層相同的讀取逾時 (build 預設為 60 秒)
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT[1]))
+        return build(service_name, version, http=http, static_discovery=True, cache_discovery=False)
+    if _http is None:
+        _http = RequestsHttp(creds)
+    return build(service_name, version, http=_http, static_discovery=True, cache_discovery=False)
+
 def get_google_service(service_name, version):
     """
-    動態取得 Google 服務連線 (含自動更新 Token 功能)。
+    取得 Google 服務連線 (含自動更新 Token 功能)。
+    Client 依 (服務, 版本) 快取，不再每次重建；預設的 requests 傳輸層可跨執行緒共用。
     """
-    creds = None
-    # 注意：這裡假設 token.json 在專案根目錄
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                print(f"正在更新 {service_name} 的 Access Token...", flush=True)
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"Token 更新失敗: {e}")
-                return None
-        else:
-            print("警告：憑證不存在或已失效且無法更新，請重新執行 setup_google.py")
-            return None
-        
+    creds = get_credentials()
+    if creds is None: return None
+
+    if GOOGLE_API_TRANSPORT == "httplib2":
+        clients, lock = getattr(_local, "clients", None), None
+        if clients is None:
+            clients = _local.clients = {}
+    else:
+        clients, lock = _clients, _clients_lock
+
+    key = (service_name, version)
+    service = clients.get(key)
+    if service is not None: return service
+
     try:
-        service = build(service_name, version, credentials=creds)
-        return service
+        if lock is None:
+            service = _build(service_name, version, creds)
+        else:
+            with lock:
+                service = clients.get(key) or _build(service_name, version, creds)
     except Exception as e:
         print(f"連線 {service_name} 失敗: {e}")
-        return None
\ No newline at end of file
+        return None
+    clients[key] = service
+    return service
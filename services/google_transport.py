@@ -0,0 +1,59 @@
+# services/google_transport.py
+"""
+googleapiclient 的執行緒安全 HTTP 傳輸層。
+以 google-auth 的 AuthorizedSession (requests + urllib3 連線池) 取代 httplib2：
+- 多個執行緒可共用同一個 Client 平行呼叫 Sheets / Calendar / Tasks
+- 每個主機維持 keep-alive 連線池，不必每次重新握手
+- Token 過期或 401 時由 Credentials.refresh 更新 (經由 CredentialManager 的 single-flight)
+"""
+import os
+import socket
+import httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+# 同時連線數上限 (所有 Google API 共用，依主機各自一個連線池)
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv("GOOGLE_HTTP_POOL_SIZE", 16))
+# (連線, 讀取) 逾時秒數；讀取逾時須小於工具逾時 (gemini_ai.TOOL_TIMEOUT 預設 20 秒)，
+# 否則工具已回報逾時，呼叫仍佔用 worker 直到讀取逾時
+GOOGLE_HTTP_TIMEOUT = (5, float(os.getenv("GOOGLE_HTTP_READ_TIMEOUT", 12)))
+
+class RequestsHttp:
+    """
+    實作 googleapiclient 需要的 httplib2.Http 介面 (request / close / credentials)。
+    request() 回傳 (httplib2.Response, bytes)，與 httplib2 相同。
+    """
+
+    def __init__(self, credentials, pool_size=GOOGLE_HTTP_POOL_SIZE, timeout=GOOGLE_HTTP_TIMEOUT):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.session = AuthorizedSession(credentials)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        try:
+            resp = self.session.request(
+                method, uri, data=body, headers=headers,
+                timeout=self.timeout, allow_redirects=redirections > 0
+            )
+        # 轉為 googleapiclient 會重試的例外型別
+        except requests.exceptions.Timeout as e:
+            raise socket.timeout(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+
+        info = {key.lower(): value for key, value in resp.headers.items()}
+        # requests 已解壓縮內容，與 httplib2 相同地移除 content-encoding
+        if "content-encoding" in info:
+            info["-content-encoding"] = info.pop("content-encoding")
+            info.pop("content-length", None)
+        info["status"] = str(resp.status_code)
+        response = httplib2.Response(info)
+        response.reason = resp.reason
+        return response, resp.content
+
+    def close(self):
+        self.session.close()
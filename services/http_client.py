@@ -0,0 +1,115 @@
+# services/http_client.py
+"""
+共用的 HTTP Client (氣象署、TDX、網頁爬取等對外 REST 呼叫)。
+- 每個主機一個 requests.Session (keep-alive 連線池)，重複呼叫不必重新建立 TCP + TLS
+- 預設逾時 (連線, 讀取)，避免外部服務無回應時卡住工具執行緒
+- 429 / 5xx 以指數退避重試 (遵守 Retry-After)；連線錯誤同樣重試。
+  重試只在呼叫開始後 HTTP_RETRY_WINDOW 秒內發起，整體耗時低於工具 / 例行報告的逾時
+- 每個主機的同時連線數上限
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 8))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+# 呼叫開始後多久內才發起重試 (秒)；最壞情況約為 此值 + 連線逾時 + 讀取逾時 (預設 13 秒)，
+# 低於 TOOL_TIMEOUT (20) 與 ROUTINE_TIMEOUT (15)，避免逾時被放棄的執行緒繼續佔用連線
+HTTP_RETRY_WINDOW = float(os.getenv("HTTP_RETRY_WINDOW", 2))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+# 個別主機的連線數上限 (覆寫 HTTP_POOL_SIZE)；TDX 有每秒請求數限制
+HOST_POOL_LIMITS = {
+    "tdx.transportdata.tw": 4,
+}
+# 最多保留幾個主機的 Session (網頁爬取會遇到各種主機，超過則移除最久未使用的)
+MAX_HOSTS = 32
+
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+# urllib3 預設不重試 POST；目前的 POST 只有 TDX 取得 Token (重送無副作用)
+_RETRY_METHODS = Retry.DEFAULT_ALLOWED_METHODS | {"POST"}
+
+_sessions = OrderedDict()   # "scheme://host" -> Session
+_lock = threading.Lock()
+_requests_by_host = {}     # "scheme://host" -> 請求次數
+_local = threading.local()  # 目前執行緒這次呼叫的重試期限 (request() 設定)
+
+def _remaining():
+    deadline = getattr(_local, "deadline", None)
+    return None if deadline is None else deadline - time.monotonic()
+
+class _WindowedRetry(Retry):
+    """超過這次呼叫的重試期限後不再重試 (回傳最後的回應或拋出錯誤)；退避與 Retry-After 的等待不超過期限。"""
+
+    def is_exhausted(self):
+        remaining = _remaining()
+        return super().is_exhausted() or (remaining is not None and remaining <= 0)
+
+    def _cap(self, seconds):
+        remaining = _remaining()
+        if seconds is None or remaining is None: return seconds
+        return max(min(seconds, remaining), 0)
+
+    def get_backoff_time(self):
+        return self._cap(super().get_backoff_time())
+
+    def get_retry_after(self, response):
+        return self._cap(super().get_retry_after(response))
+
+def _new_session(host):
+    retry = _WindowedRetry(
+        total=HTTP_RETRIES,
+        read=0,                         # 讀取逾時不重試 (已等待 HTTP_READ_TIMEOUT)
+        backoff_factor=0.5,             # 0.5, 1, 2 秒...
+        status_forcelist=_RETRY_STATUS,
+        allowed_methods=_RETRY_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,          # 重試用完後回傳最後的回應，交由呼叫端判斷
+    )
+    pool_size = HOST_POOL_LIMITS.get(host, HTTP_POOL_SIZE)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session(url: str) -> requests.Session:
+    """取得該網址主機的共用 Session。"""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session(parts.hostname)
+            while len(_sessions) > MAX_HOSTS:
+                # 不主動 close (其他執行緒可能仍在使用)，連線隨 Session 被回收時關閉
+                oldest, _ = _sessions.popitem(last=False)
+                _requests_by_host.pop(oldest, None)
+        else:
+            _sessions.move_to_end(key)
+        _requests_by_host[key] = _requests_by_host.get(key, 0) + 1
+    return session
+
+def request(method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """與 requests.request 相同，但使用共用連線池、預設逾時與重試。"""
+    if timeout is None: timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    _local.deadline = time.monotonic() + HTTP_RETRY_WINDOW
+    try:
+        return get_session(url).request(method, url, timeout=timeout, **kwargs)
+    finally:
+        _local.deadline = None
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+def stats():
+    with _lock:
+        return {"hosts": len(_sessions), "requests": dict(_requests_by_host)}
@@ -0,0 +1,41 @@
+# services/local_storage.py
+"""
+本機檔案 (Session SQLite、Sheets Journal) 是否會在重啟後消失。
+Cloud Run 的容器檔案系統 (含 /tmp) 存在記憶體中，執行個體結束或冷啟動後即清空；
+只有掛載的磁碟區 (Cloud Storage FUSE、NFS 等) 能跨執行個體保留。
+"""
+import os
+
+# 資料只存在記憶體中的檔案系統
+_MEMORY_FS = {"tmpfs", "ramfs"}
+
+def _mount_of(path):
+    """path 所在的掛載點與檔案系統類型 (讀取 /proc/mounts；無法判斷時回傳 (None, None))。"""
+    path = os.path.realpath(path)
+    best = (None, None)
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3: continue
+                mount_point = fields[1].replace("\\040", " ")
+                prefix = mount_point.rstrip("/") + "/"
+                if (path == mount_point or path.startswith(prefix)) and len(mount_point) >= len(best[0] or ""):
+                    best = (mount_point, fields[2])
+    except OSError:
+        pass
+    return best
+
+def is_ephemeral(path) -> bool:
+    """path 的資料是否只存在於本執行個體 (tmpfs，或 Cloud Run 上未掛載磁碟區的容器檔案系統)。"""
+    mount_point, fs_type = _mount_of(path)
+    if fs_type in _MEMORY_FS: return True
+    # Cloud Run (K_SERVICE 由平台設定)：根檔案系統即容器本身的記憶體檔案系統
+    return bool(os.getenv("K_SERVICE")) and mount_point in (None, "/")
+
+def warn_if_ephemeral(path, what, env_name):
+    """啟動時檢查：資料不會保留時印出警告並回傳 True。"""
+    if not is_ephemeral(path): return False
+    print(f"⚠️ {what} ({path}) 位於不會保留的檔案系統，冷啟動或換執行個體後即遺失；"
+          f"請將 {env_name} 指向掛載的磁碟區", flush=True)
+    return True
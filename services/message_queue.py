@@ -0,0 +1,99 @@
+# services/message_queue.py
+import asyncio
+import os
+import time
+from collections import deque
+
+# 合併視窗 (秒)：第一則訊息到達後等待這段時間，期間內的後續訊息合併成一次 Gemini 對話
+MESSAGE_COALESCE_WINDOW = float(os.getenv("MESSAGE_COALESCE_WINDOW", 0.8))
+# 最長等待 (秒)：用戶持續輸入時，最多等這麼久就開始處理
+MESSAGE_MAX_WAIT = float(os.getenv("MESSAGE_MAX_WAIT", 3.0))
+
+class _UserQueue:
+    __slots__ = ("pending", "worker")
+
+    def __init__(self):
+        self.pending = []   # [(item, future, enqueued_at)]
+        self.worker = None
+
+class UserMessageQueue:
+    """
+    每位用戶一條序列化佇列，放在 Gemini 對話之前。
+    - 同一用戶：依序處理；短時間內連續到達的訊息合併為一批，只跑一次對話
+      (對話進行中到達的訊息，也會在下一批一起處理)
+    - 不同用戶：各自的 worker 平行處理
+    - 提供佇列深度與等待時間統計
+    """
+
+    def __init__(self, process, window: float = MESSAGE_COALESCE_WINDOW, max_wait: float = MESSAGE_MAX_WAIT):
+        self.process = process  # async (user_id, items) -> None
+        self.window = window
+        self.max_wait = max_wait
+        self._queues = {}       # user_id -> _UserQueue
+
+        self._waits = deque(maxlen=500)  # 最近的等待時間 (到達 -> 開始處理)
+        self.received = 0
+        self.batches = 0
+        self.coalesced = 0      # 被合併進其他訊息的數量
+        self.max_depth = 0
+
+    async def submit(self, user_id, item):
+        """放入佇列，並等待包含這則訊息的批次處理完成。"""
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = _UserQueue()
+
+        future = asyncio.get_running_loop().create_future()
+        queue.pending.append((item, future, time.monotonic()))
+        self.received += 1
+        self.max_depth = max(self.max_depth, len(queue.pending))
+
+        if queue.worker is None:
+            queue.worker = asyncio.create_task(self._run(user_id, queue))
+        return await future
+
+    async def _run(self, user_id, queue):
+        try:
+            while queue.pending:
+                # 等待合併視窗：視窗內有新訊息則延長，但不超過 max_wait
+                first_at = queue.pending[0][2]
+                while True:
+                    last_at = queue.pending[-1][2]
+                    deadline = min(last_at + self.window, first_at + self.max_wait)
+                    delay = deadline - time.monotonic()
+                    if delay <= 0: break
+                    await asyncio.sleep(delay)
+
+                batch, queue.pending = queue.pending, []
+                started = time.monotonic()
+                self._waits.extend(started - enqueued_at for _, _, enqueued_at in batch)
+                self.batches += 1
+                self.coalesced += len(batch) - 1
+
+                try:
+                    result = await self.process(user_id, [item for item, _, _ in batch])
+                    for _, future, _ in batch:
+                        if not future.done(): future.set_result(result)
+                except Exception as e:
+                    for _, future, _ in batch:
+                        if not future.done(): future.set_exception(e)
+        finally:
+            queue.worker = None
+            if not queue.pending:
+                self._queues.pop(user_id, None)
+
+    def stats(self):
+        waits = sorted(self._waits)
+        depths = {user_id: len(q.pending) for user_id, q in self._queues.items()}
+        return {
+            "active_users": len(self._queues),
+            "queued": sum(depths.values()),
+            "max_queued_per_user": max(depths.values(), default=0),
+            "max_depth_seen": self.max_depth,
+            "received": self.received,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0,
+            "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0,
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0,
+        }
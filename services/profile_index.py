@@ -0,0 +1,137 @@
+# services/profile_index.py
+import os
+import threading
+import time
+from services.google_api import get_google_service, SPREADSHEET_ID
+from services.sheet_records import full_range, parse_rows, width_of
+from services.sheets_cache import sheets_cache
+from services.sheets_mirror import normalize_date
+from services.sheets_writer import sheets_writer
+
+# 過時 (被較新值取代) 的列數達到此值時，於背景壓縮 user_profile 頁籤；
+# 壓縮會改寫資料來源，預設 0 不自動執行 (需要時呼叫 profile_index.compact)
+PROFILE_COMPACT_THRESHOLD = int(os.getenv("PROFILE_COMPACT_THRESHOLD", 0))
+# 壓縮失敗後多久內不再自動重試 (秒)
+COMPACT_RETRY_HOLD = 600
+
+PROFILE_TAB = "user_profile"
+
+def _key(domain, attribute):
+    return (str(domain).strip().casefold(), str(attribute).strip().casefold())
+
+class ProfileIndex:
+    """
+    user_profile 的最新值索引：(領域, 屬性) -> 最新的一列 (依日期；同日期以較後面的列為準)。
+    - update_user_profile 只會新增列，索引以增量方式更新 (只處理上次之後新增的列)；
+      資料列變少或先前的最後一列不同時完整重建
+    - compact() 以一次 values().update 將頁籤改寫為只剩最新值 (其餘列清空)；
+      只在明確呼叫或設定 PROFILE_COMPACT_THRESHOLD 時執行
+    """
+
+    def __init__(self, compact_threshold=PROFILE_COMPACT_THRESHOLD):
+        self.compact_threshold = compact_threshold
+        self._latest = {}       # key -> (排序用的日期, ProfileEntry)，依第一次出現的順序
+        self._indexed = 0       # 已處理的紀錄數
+        self._last_entry = None
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._retry_at = 0.0
+
+        self.rebuilds = 0
+        self.compactions = 0
+        self.rows_removed = 0
+
+    def _add(self, entry):
+        if not str(entry.domain).strip() and not str(entry.attribute).strip(): return   # 空白列
+        key = _key(entry.domain, entry.attribute)
+        day = normalize_date(entry.date) or ""
+        current = self._latest.get(key)
+        # 日期較新或相同 (後寫入者為準) 時取代
+        if current is None or day >= current[0]:
+            self._latest[key] = (day, entry)
+
+    def update(self, records):
+        """以目前的頁籤內容 (ProfileEntry 紀錄，不含標題列) 更新索引，回傳最新值的紀錄 (依第一次出現的順序)。"""
+        with self._lock:
+            unchanged = (0 < self._indexed <= len(records)
+                         and records[self._indexed - 1] == self._last_entry)
+            if not unchanged:
+                self._latest, self._indexed = {}, 0
+                self.rebuilds += 1
+            for entry in records[self._indexed:]:
+                self._add(entry)
+            self._indexed = len(records)
+            self._last_entry = records[-1] if records else None
+            latest = [entry for _, entry in self._latest.values()]
+            stale = self._indexed - len(latest)
+
+        if self.compact_threshold and stale >= self.compact_threshold:
+            self._schedule_compact()
+        return latest
+
+    def _schedule_compact(self):
+        with self._lock:
+            if self._compacting or time.monotonic() < self._retry_at: return
+            self._compacting = True
+        threading.Thread(target=self._compact_in_background, name="profile-compact", daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            service = get_google_service('sheets', 'v4')
+            if service: self.compact(service)
+        except Exception as e:
+            print(f"user_profile 壓縮失敗: {e}", flush=True)
+            self._retry_at = time.monotonic() + COMPACT_RETRY_HOLD
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def compact(self, service):
+        """
+        將 user_profile 改寫為只包含每個 (領域, 屬性) 的最新值 (一次 values().update，多出的列以空白覆蓋)。
+        先送出 Write-behind 佇列中的資料，並在改寫期間暫停送出，避免覆蓋剛新增的列。
+        回傳移除的列數。
+        """
+        with sheets_writer.exclusive() as flushed:
+            if not flushed:
+                raise RuntimeError("尚有資料未寫入 Sheets，稍後再壓縮")
+            # 直接讀取 Sheets (不經快取)，以最新內容為準；
+            # 讀取原始值 (公式、未格式化的數字，日期為顯示字串)，以 USER_ENTERED 寫回時內容不變
+            result = service.spreadsheets().values().get(
+                spreadsheetId=SPREADSHEET_ID, range=full_range(PROFILE_TAB),
+                valueRenderOption="FORMULA", dateTimeRenderOption="FORMATTED_STRING"
+            ).execute()
+            rows = result.get('values', [])
+            if len(rows) <= 1: return 0
+
+            index = ProfileIndex(compact_threshold=0)
+            latest = index.update(parse_rows(PROFILE_TAB, rows[1:]))
+            removed = len(rows) - 1 - len(latest)
+            if removed <= 0: return 0
+
+            blank = [""] * width_of(PROFILE_TAB)
+            values = [list(entry) for entry in latest] + [blank] * removed
+            service.spreadsheets().values().update(
+                spreadsheetId=SPREADSHEET_ID, range=f"{PROFILE_TAB}!A2:D{len(rows)}",
+                valueInputOption="USER_ENTERED", body={'values': values}
+            ).execute()
+
+        sheets_cache.invalidate(PROFILE_TAB)
+        with self._lock:
+            self.compactions += 1
+            self.rows_removed += removed
+        print(f"user_profile 已壓縮：移除 {removed} 筆過時的資料", flush=True)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "attributes": len(self._latest),
+                "rows_indexed": self._indexed,
+                "rebuilds": self.rebuilds,
+                "compactions": self.compactions,
+                "rows_removed": self.rows_removed,
+            }
+
+# 全域共用的索引
+profile_index = ProfileIndex()
@@ -0,0 +1,106 @@
+# services/reply_stream.py
+import asyncio
+import logging
+import os
+import time
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+from services.telegram_render import split_html
+
+logger = logging.getLogger(__name__)
+
+# 兩次編輯之間的最短間隔 (秒)；Telegram 私訊約每秒 1 則訊息 / 編輯
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+# 串流中的暫時訊息長度上限 (Telegram 單則上限 4096 字)
+PREVIEW_LIMIT = 4000
+
+def _retry_seconds(e: RetryAfter) -> float:
+    delay = e.retry_after
+    return delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+
+class StreamingReply:
+    """
+    將串流中的回覆以節流方式更新到「同一則」Telegram 訊息。
+    - push() 可從工作執行緒呼叫，只記錄最新文字，不直接呼叫 Telegram API
+    - 背景 Task 每隔 min_interval 秒最多編輯一次，遇到 RetryAfter 則依指示延後
+    - finish() 送出最終版本 (以 HTML 發送，超過長度上限時其餘部分依序以新訊息發送)
+    """
+
+    def __init__(self, message, render, min_interval: float = STREAM_EDIT_INTERVAL):
+        self.message = message      # 用戶傳來的訊息 (回覆對象)
+        self.render = render        # 部分文字 -> Telegram HTML
+        self.min_interval = min_interval
+        self.sent = None            # 已送出的回覆訊息 (之後都以編輯更新)
+
+        self._loop = asyncio.get_running_loop()
+        self._latest = None
+        self._shown = None
+        self._next_edit_at = 0.0
+        self._changed = asyncio.Event()
+        self._closed = False
+        self._task = self._loop.create_task(self._run())
+
+    def push(self, text: str):
+        """(執行緒安全) 更新目前累積的文字。"""
+        self._latest = text
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    async def _run(self):
+        while not self._closed:
+            await self._changed.wait()
+            self._changed.clear()
+            if self._closed: break
+
+            # 節流：距離上次編輯未滿 min_interval 則先等待 (期間的更新會合併)
+            wait = self._next_edit_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                if self._closed: break
+
+            html = self.render(self._latest or "")
+            if len(html) > PREVIEW_LIMIT: html = split_html(html, PREVIEW_LIMIT)[0] + "…"
+            await self._show(html, final=False)
+
+    async def _show(self, html: str, final: bool):
+        """送出或編輯訊息；暫時版本失敗時略過，最終版本會重試 RetryAfter。"""
+        if not html.strip() or html == self._shown: return
+        while True:
+            try:
+                if self.sent is None:
+                    self.sent = await self.message.reply_text(html, parse_mode=ParseMode.HTML)
+                else:
+                    await self.sent.edit_text(html, parse_mode=ParseMode.HTML)
+                self._shown = html
+                self._next_edit_at = time.monotonic() + self.min_interval
+                return
+            except RetryAfter as e:
+                delay = _retry_seconds(e)
+                self._next_edit_at = time.monotonic() + delay
+                if not final: return
+                await asyncio.sleep(delay)
+            except BadRequest as e:
+                if "not modified" in str(e).lower(): return
+                if final: raise
+                # 部分文字的 HTML 可能不完整 (例如標籤尚未結束)，等下一段再試
+                logger.debug(f"串流暫時訊息略過: {e}")
+                return
+
+    async def finish(self, final_html: str):
+        """停止節流更新並送出最終版本；回傳回覆訊息物件。"""
+        self._closed = True
+        self._changed.set()
+        await self._task
+        wait = self._next_edit_at - time.monotonic()
+        if wait > 0: await asyncio.sleep(wait)
+
+        first, *rest = split_html(final_html)
+        await self._show(first, final=True)
+        for part in rest:
+            await self.message.reply_text(part, parse_mode=ParseMode.HTML)
+        return self.sent
+
+    async def cancel(self):
+        """放棄串流 (發生錯誤時)。"""
+        self._closed = True
+        self._changed.set()
+        await self._task
@@ -0,0 +1,100 @@
+# services/routines.py
+"""
+排程例行報告 (GitHub Actions -> /trigger_routine)。
+工具輸出本身已是整理好的格式，因此直接平行呼叫工具並組合結果，不經過 LLM；
+LLM 只在需要時用於附加的簡短評論 (見 main.py)。
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tools import (
+    get_weather_forecast, get_weekly_forecast, get_current_solar_term,
+    get_upcoming_events, get_todo_tasks, get_train_status
+)
+
+# 單一工具的逾時 (秒)；逾時的區塊以提示文字取代，其餘照常送出
+ROUTINE_TIMEOUT = float(os.getenv("ROUTINE_TIMEOUT", 15))
+
+# 區塊內容包含以下文字時視為「沒有資料」，可選區塊 (optional=True) 會直接省略
+_EMPTY_MARKERS = ("沒有安排行程", "目前沒有未完成項目")
+
+# 例行報告定義：steps 為 (名稱, 工具, 參數, 可省略)，依列出順序組合輸出
+# commentary：預設附加的 LLM 評論指示 (None 表示不評論)；可由 payload 的 "commentary" 覆寫
+ROUTINES = {
+    "morning": {
+        "title": "☀️ 早安，晨間喚醒",
+        "steps": [
+            ("今日天氣", get_weather_forecast, {}, False),
+            ("節氣", get_current_solar_term, {}, False),
+            ("今日行程", get_upcoming_events, {"days": 1}, False),
+            ("重點日常待辦", get_todo_tasks, {}, False),
+            ("火車時刻", get_train_status, {"mode": "routine_morning"}, False),
+        ],
+        "commentary": None,
+    },
+    "noon": {
+        "title": "🕐 午休結束，進度追蹤",
+        "steps": [
+            ("今日天氣", get_weather_forecast, {}, False),
+            ("重點日常待辦", get_todo_tasks, {}, False),
+            ("今日行程", get_upcoming_events, {"days": 1}, True),
+        ],
+        "commentary": None,
+    },
+    "evening": {
+        "title": "🌆 下班了，工作總結與運動規劃",
+        "steps": [
+            ("重點日常待辦", get_todo_tasks, {}, False),
+            ("中期計畫", get_todo_tasks, {"list_name": "中期計畫"}, False),
+            ("火車時刻", get_train_status, {"mode": "routine_evening"}, False),
+        ],
+        "commentary": "請依據以上待辦與計畫，用兩三句話給出今晚的運動規劃建議 (需要時可查詢健身相關資料)。",
+    },
+    "night": {
+        "title": "🌙 睡前準備與結算",
+        "steps": [
+            ("明日行程", get_upcoming_events, {"days": 2}, False),
+            ("重點日常待辦", get_todo_tasks, {}, False),
+        ],
+        "commentary": None,
+    },
+    "weekly": {
+        "title": "📅 下週天氣預報",
+        "steps": [
+            ("一週天氣", get_weekly_forecast, {}, False),
+        ],
+        "commentary": None,
+    },
+}
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="routine")
+
+async def _run_step(label, func, kwargs):
+    loop = asyncio.get_running_loop()
+    try:
+        result = await asyncio.wait_for(loop.run_in_executor(_executor, lambda: func(**kwargs)), ROUTINE_TIMEOUT)
+        return str(result).strip()
+    except asyncio.TimeoutError:
+        return f"⚠️ {label}：查詢逾時，請稍後再試。"
+    except Exception as e:
+        return f"⚠️ {label}：查詢失敗 ({e})"
+
+async def run_routine(name: str) -> str:
+    """
+    平行執行例行報告的所有工具並組合為一則訊息 (尚未轉為 HTML，交由 render_reply 處理)。
+    未知的名稱會拋出 KeyError。
+    """
+    routine = ROUTINES[name]
+    started = time.monotonic()
+    steps = routine["steps"]
+    results = await asyncio.gather(*(_run_step(label, func, kwargs) for label, func, kwargs, _ in steps))
+
+    blocks = [f"**{routine['title']}**"]
+    for (_, _, _, optional), text in zip(steps, results):
+        if not text: continue
+        if optional and any(marker in text for marker in _EMPTY_MARKERS): continue
+        blocks.append(text)
+
+    print(f"例行報告 {name} 完成 ({time.monotonic() - started:.2f}s)", flush=True)
+    return "\n\n".join(blocks)
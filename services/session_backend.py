@@ -0,0 +1,102 @@
+# services/session_backend.py
+import os
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from google.generativeai import protos
+from services.local_storage import warn_if_ephemeral
+
+#本地測試可改為專案目錄下的 sessions.db
+#雲端部署預設寫入 /tmp；若要跨執行個體保留，請指向掛載的磁碟區 (例如 Cloud Run Volume Mount)
+#/tmp 在 Cloud Run 上存在記憶體中，冷啟動後歷史即消失 (啟動時會印出警告)
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "/tmp/sessions.db")
+
+def encode_content(content) -> bytes:
+    """protos.Content -> 壓縮後的 protobuf 二進位 (比 JSON 小很多，且還原時不需重跑工具)。"""
+    return zlib.compress(protos.Content.serialize(content))
+
+def decode_content(blob: bytes):
+    return protos.Content.deserialize(zlib.decompress(blob))
+
+class SessionBackend(ABC):
+    """
+    Session 歷史的持久化介面。
+    每一筆歷史 (protos.Content) 依序存放；記憶體中的歷史與持久化的資料一對一對應。
+    未實作所有方法的後端在建立時就會拋出 TypeError。
+    """
+
+    @abstractmethod
+    def load(self, user_id):
+        """讀取該用戶的完整歷史；不存在則回傳 None。"""
+
+    @abstractmethod
+    def append(self, user_id, contents):
+        """在歷史尾端追加新的幾筆 (每輪對話只寫入新增部分)。"""
+
+    @abstractmethod
+    def drop(self, user_id, offset, count):
+        """刪除第 offset 筆起的 count 筆歷史 (對應記憶體中的修剪)。"""
+
+    @abstractmethod
+    def delete(self, user_id):
+        """刪除該用戶的所有歷史。"""
+
+class SQLiteSessionBackend(SessionBackend):
+    """以本機 SQLite 儲存 Session 歷史 (每筆歷史一列，依 seq 排序)。"""
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        warn_if_ephemeral(path, "對話紀錄", "SESSION_DB_PATH")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " user_id INTEGER NOT NULL, seq INTEGER NOT NULL, content BLOB NOT NULL,"
+            " PRIMARY KEY (user_id, seq)) WITHOUT ROWID"
+        )
+
+    def load(self, user_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content FROM messages WHERE user_id = ? ORDER BY seq", (user_id,)
+            ).fetchall()
+        if not rows: return None
+        return [decode_content(blob) for (blob,) in rows]
+
+    def append(self, user_id, contents):
+        if not contents: return
+        blobs = [encode_content(c) for c in contents]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                (last_seq,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                self._conn.executemany(
+                    "INSERT INTO messages (user_id, seq, content) VALUES (?, ?, ?)",
+                    [(user_id, last_seq + 1 + i, blob) for i, blob in enumerate(blobs)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def drop(self, user_id, offset, count):
+        if count <= 0: return
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM messages WHERE user_id = ? AND seq IN ("
+                " SELECT seq FROM messages WHERE user_id = ? ORDER BY seq LIMIT ? OFFSET ?)",
+                (user_id, user_id, count, offset)
+            )
+
+    def delete(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
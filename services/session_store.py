@@ -0,0 +1,199 @@
+# services/session_store.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 預設上限 (可由環境變數覆寫)
+SESSION_MAX = int(os.getenv("SESSION_MAX", 200))                       # 最多保留幾個 Session
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", 6 * 3600))        # 閒置幾秒後淘汰
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 64 * 1024))     # 每個 Session 歷史的位元組預算
+
+def content_size(content) -> int:
+    """估算單筆歷史 (protos.Content) 的序列化大小 (bytes)。"""
+    try:
+        return type(content).pb(content).ByteSize()
+    except Exception:
+        return len(str(content).encode("utf-8"))
+
+def _is_user_turn(content) -> bool:
+    """是否為一輪對話的開頭：用戶的文字訊息 (不是回傳給模型的 function_response)。"""
+    if content.role != "user": return False
+    return any(part.text for part in content.parts)
+
+class _Entry:
+    __slots__ = ("chat_session", "last_used", "persisted")
+
+    def __init__(self, chat_session, last_used, persisted=0):
+        self.chat_session = chat_session
+        self.last_used = last_used
+        self.persisted = persisted  # 已寫入 backend 的歷史筆數
+
+class SessionStore:
+    """
+    有上限的 ChatSession 儲存區。
+    - LRU：超過 max_sessions 時淘汰最久未使用的 Session
+    - 閒置 TTL：超過 idle_ttl 秒未使用即淘汰
+    - 歷史預算：單一 Session 超過 max_history_bytes 時，從最舊的對話輪次開始刪除，
+      但保留開頭 keep_head 筆 (系統指令) 與最新一輪
+    - 持久化 (選用)：指定 backend 與 session_factory 後，記憶體中沒有的 Session
+      會在需要時從 backend 懶載入；每輪對話只增量寫入新增的歷史
+    """
+
+    def __init__(self, max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL,
+                 max_history_bytes=SESSION_MAX_BYTES, keep_head=2,
+                 backend=None, session_factory=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history_bytes = max_history_bytes
+        self.keep_head = keep_head
+        self.backend = backend
+        self.session_factory = session_factory  # history -> ChatSession
+
+        self._sessions = OrderedDict()  # user_id -> _Entry
+        self._sizes = {}                # user_id -> 最近一次量測的歷史大小
+        self._lock = threading.Lock()
+
+        self.evicted = 0        # 因 LRU / TTL 被淘汰的 Session 數 (backend 中仍保留)
+        self.trimmed_turns = 0  # 因預算被刪除的對話輪數
+        self.restored = 0       # 從 backend 懶載入的 Session 數
+
+    def _expire(self, now):
+        """淘汰閒置過久的 Session (OrderedDict 依使用時間排序，只需檢查開頭)。"""
+        while self._sessions:
+            user_id, entry = next(iter(self._sessions.items()))
+            if now - entry.last_used <= self.idle_ttl: break
+            self._drop(user_id)
+            self.evicted += 1
+
+    def _drop(self, user_id):
+        self._sessions.pop(user_id, None)
+        self._sizes.pop(user_id, None)
+
+    def _insert(self, user_id, entry):
+        self._sessions[user_id] = entry
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_sessions:
+            oldest = next(iter(self._sessions))
+            self._drop(oldest)
+            self.evicted += 1
+
+    def _restore(self, user_id):
+        """從 backend 還原 Session (不重跑任何工具呼叫)。"""
+        if self.backend is None or self.session_factory is None: return None
+        history = self.backend.load(user_id)
+        if not history: return None
+        chat_session = self.session_factory(history)
+        with self._lock:
+            # 若其他執行緒已搶先放入，以記憶體中的為準
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                entry = _Entry(chat_session, time.monotonic(), persisted=len(history))
+                self._insert(user_id, entry)
+                self.restored += 1
+            return entry.chat_session
+
+    def get(self, user_id):
+        """取得 Session (並更新 LRU 順序)；記憶體中沒有則嘗試從 backend 載入，都沒有則回傳 None。"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(user_id)
+            if entry is not None:
+                entry.last_used = now
+                self._sessions.move_to_end(user_id)
+                return entry.chat_session
+        return self._restore(user_id)
+
+    def put(self, user_id, chat_session):
+        """放入一個全新的 Session (會取代 backend 中的舊歷史)。"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._insert(user_id, _Entry(chat_session, now))
+        if self.backend is not None:
+            self.backend.delete(user_id)
+
+    def pop(self, user_id):
+        """移除 Session (重置記憶，backend 中的歷史一併刪除)。"""
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            self._drop(user_id)
+        if self.backend is not None:
+            self.backend.delete(user_id)
+        return entry.chat_session if entry else None
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def commit(self, user_id):
+        """
+        一輪對話結束後呼叫 (同一用戶的 Lock 內)：
+        1. 修剪超過預算的歷史
+        2. 將新增的歷史增量寫入 backend
+        回傳刪除的輪數。
+        """
+        with self._lock:
+            entry = self._sessions.get(user_id)
+        if entry is None: return 0
+
+        dropped_range = self._trim(user_id, entry)
+        if self.backend is not None:
+            if dropped_range:
+                offset, count, _ = dropped_range
+                # 只刪除已持久化的部分
+                persisted_count = max(0, min(count, entry.persisted - offset))
+                self.backend.drop(user_id, offset, persisted_count)
+                entry.persisted -= persisted_count
+            history = entry.chat_session.history
+            self.backend.append(user_id, history[entry.persisted:])
+            entry.persisted = len(history)
+        return dropped_range[2] if dropped_range else 0
+
+    def _trim(self, user_id, entry):
+        """修剪歷史；有刪除時回傳 (起始位置, 刪除筆數, 刪除輪數)，否則回傳 None。"""
+        chat_session = entry.chat_session
+        history = chat_session.history
+        sizes = [content_size(c) for c in history]
+        total = sum(sizes)
+
+        dropped = 0
+        if total > self.max_history_bytes:
+            head = self.keep_head
+            # 每一輪的起點 (用戶文字訊息)；最後一輪永遠保留
+            starts = [i for i in range(head, len(history)) if _is_user_turn(history[i])]
+            cut = head
+            for next_start in starts[1:]:
+                if total <= self.max_history_bytes: break
+                total -= sum(sizes[cut:next_start])
+                cut = next_start
+                dropped += 1
+            if dropped:
+                chat_session.history = history[:head] + history[cut:]
+
+        with self._lock:
+            if user_id in self._sessions:
+                self._sizes[user_id] = total
+            self.trimmed_turns += dropped
+        if not dropped: return None
+        return head, cut - head, dropped
+
+    def stats(self):
+        """回報目前 Session 數量與記憶體使用 (歷史序列化大小)。"""
+        with self._lock:
+            sizes = dict(self._sizes)
+            count = len(self._sessions)
+        return {
+            "sessions": count,
+            "max_sessions": self.max_sessions,
+            "history_bytes": sum(sizes.values()),
+            "largest_session_bytes": max(sizes.values(), default=0),
+            "max_history_bytes": self.max_history_bytes,
+            "evicted": self.evicted,
+            "trimmed_turns": self.trimmed_turns,
+            "restored": self.restored,
+            "backend": type(self.backend).__name__ if self.backend else None,
+        }
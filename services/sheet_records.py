@@ -0,0 +1,98 @@
+# services/sheet_records.py
+"""
+試算表各頁籤的資料列模型 (NamedTuple)。
+- 每個頁籤一個 NamedTuple，欄位順序與試算表欄位 (A, B, C...) 相同，仍可用 index 存取
+- parse_rows() 將 values().get 回傳的不等長資料列一次轉為紀錄 (補齊尾端省略的空欄)
+- 紀錄不可變，快取 / 鏡像 / 分析可共用同一份解析結果
+"""
+from typing import NamedTuple
+
+class TrainingMove(NamedTuple):
+    part: str           # 部位
+    exercise: str       # 動作
+    intensity: str      # 強度
+    note: str           # 備註
+    image_url: str      # 圖片
+
+class HealthRecord(NamedTuple):
+    date: str
+    hp: str
+    constitution: str   # 體質
+    changes: str        # 變化
+    details: str        # 細節
+
+class WorkoutRecord(NamedTuple):
+    date: str
+    menu: str           # 菜單
+    rpe: str
+    adjustment: str     # 調整建議
+    note: str
+
+class FoodProperty(NamedTuple):
+    ingredient: str     # 食材
+    nature: str         # 性味
+    avoid_for: str      # 忌諱體質
+    note: str
+
+class Recipe(NamedTuple):
+    name: str
+    main_ingredient: str
+    season: str
+    tags: str
+    link: str
+    image_url: str
+    note: str
+
+class ProfileEntry(NamedTuple):
+    domain: str
+    attribute: str
+    value: str
+    date: str
+
+class InboxItem(NamedTuple):
+    date: str
+    url: str
+    title: str
+    note: str
+    status: str         # Unread / Read
+
+# 頁籤 -> 紀錄型別
+TAB_RECORDS = {
+    "training": TrainingMove,
+    "health_profile": HealthRecord,
+    "workout_history": WorkoutRecord,
+    "food_properties": FoodProperty,
+    "recipes": Recipe,
+    "user_profile": ProfileEntry,
+    "inbox": InboxItem,
+}
+
+# 各欄位的顯示名稱 (read_sheet_data 的 columns 參數以此選取)
+COLUMN_LABELS = {
+    "training": ["部位", "動作", "強度", "備註", "圖片"],
+    "health_profile": ["日期", "HP", "體質", "變化", "細節"],
+    "workout_history": ["日期", "菜單", "RPE", "調整建議", "備註"],
+    "food_properties": ["食材", "性味", "忌諱體質", "備註"],
+    "recipes": ["菜名", "主食材", "季節", "標籤", "連結", "圖片", "備註"],
+    "user_profile": ["領域", "屬性", "值", "日期"],
+    "inbox": ["日期", "網址", "標題", "備註", "狀態"],
+}
+
+def width_of(tab: str) -> int:
+    return len(TAB_RECORDS[tab]._fields)
+
+def full_range(tab: str) -> str:
+    """'inbox' -> 'inbox!A:E'"""
+    return f"{tab}!A:{chr(ord('A') + width_of(tab) - 1)}"
+
+def parse_rows(tab: str, rows):
+    """
+    資料列 (不含標題列) -> 紀錄 list。
+    尾端省略的欄位補上 ""，多出的欄位捨棄。
+    """
+    record = TAB_RECORDS[tab]
+    width = len(record._fields)
+    pad = ("",) * width
+    new = tuple.__new__   # 與 record._make 相同，但省去每列的方法呼叫
+    return [new(record, row) if len(row) == width else new(record, (*row, *pad)[:width])
+            for row in rows]
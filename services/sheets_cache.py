@@ -0,0 +1,212 @@
+# services/sheets_cache.py
+import os
+import re
+import threading
+import time
+from services.google_api import SPREADSHEET_ID
+from services.sheet_records import full_range, parse_rows
+
+# 各頁籤的快取秒數：參考資料表幾乎不變，紀錄類頁籤較短 (寫入時仍會立即失效)
+SHEET_CACHE_TTL = {
+    "training": 6 * 3600,
+    "food_properties": 6 * 3600,
+    "recipes": 3600,
+    "health_profile": 600,
+    "workout_history": 600,
+    "user_profile": 600,
+    "inbox": 120,
+}
+# 未列出的頁籤
+DEFAULT_SHEET_CACHE_TTL = int(os.getenv("SHEETS_CACHE_TTL", 60))
+# 只會在尾端新增資料的頁籤：快取過期時只讀取新增的列 (增量讀取)
+APPEND_ONLY_TABS = {"workout_history", "health_profile", "inbox"}
+
+_WHOLE_COLUMNS_RE = re.compile(r"^[^!]+!([A-Z]+):([A-Z]+)$")
+
+def _tab_of(range_name: str) -> str:
+    return range_name.split("!", 1)[0]
+
+def _whole_columns(range_name: str):
+    """'inbox!A:E' -> ('A', 'E')；不是整欄 range (例如 'inbox!A2:E10') 則回傳 None。"""
+    m = _WHOLE_COLUMNS_RE.match(range_name)
+    return m.groups() if m else None
+
+class SheetsCache:
+    """
+    spreadsheets().values().get 的 Read-through 快取 (依 range 快取，依頁籤設定 TTL)。
+    - 寫入工具在寫入後呼叫 invalidate(頁籤)，下次讀取即取得最新資料
+    - get_records 回傳解析後的 NamedTuple 紀錄 (不可變，多個呼叫端共用同一份)
+    - pending (選用)：頁籤 -> 尚未寫入 Sheets 的資料列 (Write-behind 佇列)，疊加在讀取結果後面
+    - append-only 頁籤：過期時保留記憶體中的資料，只讀取上次最後一列之後的資料並合併；
+      若最後一列或標題列與記憶體中的不同 (資料被刪除、排序或改欄位)，改為完整重新讀取
+    """
+
+    def __init__(self, ttl=None, default_ttl=DEFAULT_SHEET_CACHE_TTL, append_only=APPEND_ONLY_TABS):
+        self.ttl = SHEET_CACHE_TTL if ttl is None else ttl
+        self.default_ttl = default_ttl
+        self.append_only = set(append_only)
+        self._entries = {}   # range -> (到期時間, rows)
+        self._records = {}   # range -> (解析時的 rows, 紀錄)；rows 未變 (同一物件) 時沿用
+        self._versions = {}  # 頁籤 -> 失效次數 (讀取期間發生寫入時，不存入舊資料)
+        self._appends = {}   # 頁籤 -> 新增次數 (讀取期間有新增列時，存入的資料標記為已過期)
+        self._lock = threading.Lock()
+        self.pending = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.tail_reads = 0     # 增量讀取次數
+        self.tail_rows = 0      # 增量讀取取得的新列數
+        self.full_reloads = 0   # 增量讀取驗證失敗而完整重新讀取的次數
+
+    def get_records(self, service, tab: str):
+        """
+        讀取整個頁籤並轉為 NamedTuple 紀錄 (不含標題列，見 sheet_records)。
+        解析結果隨快取保存，快取有效期間不會重新解析；尚未送出的資料列接在最後。
+        """
+        records, pending = self.get_synced(service, tab)
+        return records + pending if pending else records
+
+    def get_synced(self, service, tab: str):
+        """
+        (已寫入 Sheets 的紀錄, 尚未送出的紀錄)；前者第 i 筆 (從 0 起算) 是試算表第 i + 2 列。
+        前者在快取有效期間是同一個 list 物件；增量讀取後的新 list 前段沿用同一批紀錄物件。
+        """
+        range_name = full_range(tab)
+        rows = self._get_rows(service, range_name)
+        with self._lock:
+            parsed = self._records.get(range_name)
+        if parsed is None or parsed[0] is not rows:
+            old_rows = parsed[0] if parsed else None
+            if (old_rows and 1 < len(old_rows) <= len(rows)
+                    and rows[len(old_rows) - 1] is old_rows[-1]):
+                # 增量讀取只在尾端接上新列 (前面的資料列是同一批物件)：只解析新增的部分
+                parsed = (rows, parsed[1] + parse_rows(tab, rows[len(old_rows):]))
+            else:
+                parsed = (rows, parse_rows(tab, rows[1:]))
+            with self._lock:
+                self._records[range_name] = parsed
+        pending = self.pending(tab) if self.pending is not None and rows else None
+        return parsed[1], parse_rows(tab, pending) if pending else []
+
+    def _get_rows(self, service, range_name):
+        """快取中的原始資料列 (不複製、不含尚未送出的資料列)。"""
+        tab = _tab_of(range_name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(range_name)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = self._versions.get(tab, 0)
+            appends = self._appends.get(tab, 0)
+
+        rows = None
+        columns = _whole_columns(range_name) if tab in self.append_only else None
+        if columns and entry is not None and entry[1]:
+            rows = self._read_tail(service, tab, columns, entry[1])
+        if rows is None:
+            result = service.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range=range_name).execute()
+            rows = result.get('values', [])
+
+        ttl = self.ttl.get(tab, self.default_ttl)
+        with self._lock:
+            if self._versions.get(tab, 0) == version:
+                # 讀取期間有新增列：保留資料 (下次仍可增量讀取) 但視為已過期
+                expires = now + ttl if self._appends.get(tab, 0) == appends else 0
+                self._entries[range_name] = (expires, rows)
+        return rows
+
+    def _read_tail(self, service, tab, columns, cached):
+        """
+        只讀取標題列與「上次最後一列」之後的資料 (一次 batchGet)，合併後回傳；
+        標題列或上次最後一列已改變時回傳 None (需完整重新讀取)。
+        """
+        first, last = columns
+        last_row = len(cached)
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=SPREADSHEET_ID,
+            ranges=[f"{tab}!{first}1:{last}1", f"{tab}!{first}{last_row}:{last}"]
+        ).execute()
+        header_range, tail_range = (result.get('valueRanges', []) + [{}, {}])[:2]
+        header = (header_range.get('values') or [[]])[0]
+        tail = tail_range.get('values', [])
+        # 重疊讀取上次的最後一列：不存在或內容不同表示資料表縮短或被改動
+        if not tail or header != cached[0] or tail[0] != cached[-1]:
+            with self._lock:
+                self.full_reloads += 1
+            return None
+        with self._lock:
+            self.tail_reads += 1
+            self.tail_rows += len(tail) - 1
+        return cached + tail[1:]
+
+    def expire(self, tab: str):
+        """
+        頁籤新增資料列後呼叫：append-only 頁籤保留記憶體中的資料但標記為過期，
+        下次讀取只抓新增的列；其他頁籤等同 invalidate。
+        """
+        if tab not in self.append_only: return self.invalidate(tab)
+        with self._lock:
+            for range_name, (_, rows) in list(self._entries.items()):
+                if _tab_of(range_name) == tab:
+                    self._entries[range_name] = (0, rows)
+            self._appends[tab] = self._appends.get(tab, 0) + 1
+            self.invalidations += 1
+
+    def patch(self, tab: str, updates: dict):
+        """
+        就地更新快取中的儲存格 (寫入 Sheets 成功後呼叫)，不必重新讀取整張表。
+        updates: {列號 (從 1 起算): {欄 index (A 欄為 0): 值}}；只套用於從 A 欄開始的整欄 range，其他 range 直接移除。
+        """
+        with self._lock:
+            for range_name, (expires, rows) in list(self._entries.items()):
+                if _tab_of(range_name) != tab: continue
+                columns = _whole_columns(range_name)
+                self._records.pop(range_name, None)
+                if columns is None or columns[0] != "A":
+                    del self._entries[range_name]
+                    continue
+                rows = list(rows)
+                for row_number, cells in updates.items():
+                    if not 1 <= row_number <= len(rows): continue
+                    row = list(rows[row_number - 1])
+                    for col, value in cells.items():
+                        row.extend([""] * (col + 1 - len(row)))
+                        row[col] = value
+                    rows[row_number - 1] = row
+                self._entries[range_name] = (expires, rows)
+            # 讀取中的舊資料不存入
+            self._versions[tab] = self._versions.get(tab, 0) + 1
+
+    def invalidate(self, tab: str):
+        """移除某頁籤的所有快取 (資料被改動時呼叫；append-only 頁籤下次讀取會完整重新讀取)。"""
+        with self._lock:
+            for range_name in [r for r in self._entries if _tab_of(r) == tab]:
+                del self._entries[range_name]
+                self._records.pop(range_name, None)
+            self._versions[tab] = self._versions.get(tab, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._records.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0,
+                "invalidations": self.invalidations,
+                "tail_reads": self.tail_reads,
+                "tail_rows": self.tail_rows,
+                "full_reloads": self.full_reloads,
+            }
+
+# 全域共用的快取
+sheets_cache = SheetsCache()
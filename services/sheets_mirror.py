@@ -0,0 +1,194 @@
+# services/sheets_mirror.py
+import os
+import re
+import sqlite3
+import threading
+from services.sheets_cache import sheets_cache
+from services.sheet_records import TAB_RECORDS, width_of
+
+# 設為 0 停用鏡像 (篩選改在記憶體中對 SheetsCache 的紀錄進行)
+SHEETS_MIRROR_ENABLED = os.getenv("SHEETS_MIRROR", "1") != "0"
+
+# 鏡像的頁籤 -> 日期欄 index (建立 day 索引供日期範圍查詢)；欄位與欄數見 sheet_records.TAB_RECORDS
+# 關鍵字篩選是子字串比對 (instr)，B-tree 索引派不上用場，不另建欄位索引
+MIRROR_TABS = {
+    "training": None,
+    "health_profile": 0,
+    "workout_history": 0,
+    "food_properties": None,
+    "recipes": None,
+    "user_profile": None,
+    "inbox": None,
+}
+
+_DATE_RE = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})")
+
+def normalize_date(value):
+    """'2025/1/5'、'2025-01-05' -> '2025-01-05'；無法辨識則回傳 None。"""
+    value = str(value)
+    # 工具寫入的日期已是 YYYY-MM-DD，不必跑正規表示式
+    if len(value) == 10 and value[4] == "-" and value[7] == "-" and value[:4].isdigit(): return value
+    m = _DATE_RE.search(value)
+    if not m: return None
+    return f"{m.group(1)}-{int(m.group(2)):02d}-{int(m.group(3)):02d}"
+
+class SheetsMirror:
+    """
+    SheetsCache 紀錄的 SQLite 索引 (記憶體資料庫)，供篩選查詢使用；Sheets 仍是唯一的資料來源。
+    - 不另行同步：每次查詢前向 SheetsCache 取得紀錄 (沿用快取的 TTL、增量讀取與寫入後失效)，
+      紀錄有變動才更新資料表 —— 快取只在尾端接上新列時只插入新列，否則整個頁籤重新載入
+    - 每個頁籤一張資料表 (row = 試算表列號，c0.. = 各欄)；row 與日期 (day) 有索引，
+      篩選後的 last_n / 日期範圍查詢不必掃描整個頁籤
+    - 尚未送出的資料列 (SheetsWriter 佇列) 以 row 為 NULL 存放，排在最後
+    因此篩選查詢與整張表的讀取 (SheetsCache.get_records) 看到的是同一份資料。
+    """
+
+    def __init__(self, enabled=SHEETS_MIRROR_ENABLED, cache=sheets_cache):
+        self.enabled = enabled
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._conn = None
+        self._loaded = {}   # 頁籤 -> 已載入的紀錄 (SheetsCache 回傳的 list 物件)
+        self._local = {}    # 頁籤 -> 已載入的未送出紀錄
+
+        self.refreshes = 0      # 資料表有更新的次數
+        self.full_loads = 0     # 整個頁籤重新載入的次數
+        self.rows_loaded = 0    # 寫入資料表的列數 (不含未送出的列)
+
+        if self.enabled:
+            self._open()
+
+    def _open(self):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        for tab, date_col in MIRROR_TABS.items():
+            columns = ", ".join(f"c{i} TEXT" for i in range(width_of(tab)))
+            self._conn.execute(f"CREATE TABLE t_{tab} (row INTEGER, day TEXT, {columns})")
+            self._conn.execute(f"CREATE INDEX i_{tab}_row ON t_{tab} (row)")
+            if date_col is not None:
+                self._conn.execute(f"CREATE INDEX i_{tab}_day ON t_{tab} (day)")
+
+    def _insert(self, tab, first_row, records):
+        """first_row：第一筆的試算表列號 (尚未送出的列為 None)。"""
+        width, date_col = width_of(tab), MIRROR_TABS[tab]
+        columns = ", ".join(f"c{i}" for i in range(width))
+        placeholders = ", ".join("?" * (width + 2))
+        self._conn.executemany(
+            f"INSERT INTO t_{tab} (row, day, {columns}) VALUES ({placeholders})",
+            ((None if first_row is None else first_row + i,
+              normalize_date(record[date_col]) if date_col is not None else None, *record)
+             for i, record in enumerate(records))
+        )
+
+    def _refresh(self, service, tab):
+        """依 SheetsCache 目前的紀錄更新資料表 (快取過期時由快取讀取 Sheets，期間不持有鏡像的鎖)。"""
+        records, pending = self.cache.get_synced(service, tab)
+        with self._lock:
+            loaded = self._loaded.get(tab)
+            if records is not loaded:
+                count = len(loaded) if loaded else 0
+                self._conn.execute("BEGIN")
+                try:
+                    if count and count <= len(records) and records[count - 1] is loaded[-1]:
+                        # 快取增量讀取：前段是同一批紀錄，只插入新增的列
+                        self._insert(tab, count + 2, records[count:])
+                        self.rows_loaded += len(records) - count
+                    else:
+                        self._conn.execute(f"DELETE FROM t_{tab} WHERE row IS NOT NULL")
+                        self._insert(tab, 2, records)
+                        self.rows_loaded += len(records)
+                        self.full_loads += 1
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._loaded[tab] = records
+                self.refreshes += 1
+            if pending != self._local.get(tab, []):
+                self._conn.execute(f"DELETE FROM t_{tab} WHERE row IS NULL")
+                self._insert(tab, None, pending)
+                self._local[tab] = pending
+
+    # --- 讀取 ---
+    def query(self, service, tab, date_range=None, contains=(), last_n=0):
+        """
+        篩選紀錄 (NamedTuple，不含標題列)；鏡像停用時回傳 None。
+        - date_range: (起, 迄) YYYY-MM-DD (可為 None)，限有日期欄的頁籤
+        - contains: [(欄 index, 關鍵字, (也算符合的值, ...))]，不分大小寫的子字串比對
+        - last_n: 只取最後 N 筆
+        回傳 (紀錄, 總筆數)
+        """
+        if not self.enabled or tab not in MIRROR_TABS: return None
+        self._refresh(service, tab)
+        where, params = [], []
+        if date_range:
+            start, end = date_range
+            where.append("day IS NOT NULL")
+            if start: where.append("day >= ?"); params.append(start)
+            if end: where.append("day <= ?"); params.append(end)
+        for col, key, alternatives in contains:
+            terms = [f"instr(lower(c{col}), ?) > 0"] + [f"instr(c{col}, ?) > 0"] * len(alternatives)
+            where.append("(" + " OR ".join(terms) + ")")
+            params += [key.lower(), *alternatives]
+
+        return self._select(tab, where, params, last_n)
+
+    def first_rows_not(self, service, tab, col, value, limit):
+        """
+        第 col 欄不等於 value (不分大小寫、忽略前後空白) 的前 limit 筆：[(試算表列號, 紀錄)]；鏡像停用時回傳 None。
+        依 row 索引由上往下走，找到 limit 筆即停止，不掃描整個頁籤。
+        尚未送出的列排在最後，列號為 None (寫入 Sheets 前沒有確定的列號)。
+        """
+        if not self.enabled or tab not in MIRROR_TABS: return None
+        self._refresh(service, tab)
+        columns = ", ".join(f"c{i}" for i in range(width_of(tab)))
+        condition = f"lower(trim(c{col})) <> ?"
+        key = value.strip().lower()
+        make = TAB_RECORDS[tab]._make
+        with self._lock:
+            found = [(row, make(cells)) for row, *cells in self._conn.execute(
+                f"SELECT row, {columns} FROM t_{tab} WHERE {condition} AND row IS NOT NULL ORDER BY row LIMIT ?",
+                (key, limit))]
+            if len(found) < limit:
+                found += [(None, make(cells)) for cells in self._conn.execute(
+                    f"SELECT {columns} FROM t_{tab} WHERE {condition} AND row IS NULL ORDER BY rowid LIMIT ?",
+                    (key, limit - len(found)))]
+        return found
+
+    def _select(self, tab, where, params, last_n=0):
+        """
+        依試算表列號排序的紀錄 (尚未送出的列排在最後)，回傳 (紀錄, 總筆數)。
+        已送出與未送出的列分開查詢，排序與 LIMIT 都能直接走 row 索引；SQLite 直接產生 NamedTuple，不經中間的 list。
+        """
+        make = TAB_RECORDS[tab]._make
+        sql = f"SELECT {', '.join(f'c{i}' for i in range(width_of(tab)))} FROM t_{tab} WHERE "
+        condition = "".join(f"{clause} AND " for clause in where)
+
+        def fetch(query, args):
+            cursor = self._conn.cursor()
+            cursor.row_factory = lambda _, row: make(row)
+            return cursor.execute(query, args).fetchall()
+
+        with self._lock:
+            (total,) = self._conn.execute(f"SELECT COUNT(*) FROM t_{tab}").fetchone()
+            local = fetch(sql + condition + "row IS NULL ORDER BY rowid", params)
+            if last_n and last_n > 0:
+                need = max(int(last_n) - len(local), 0)
+                synced = fetch(sql + condition + "row IS NOT NULL ORDER BY row DESC LIMIT ?", (*params, need))[::-1]
+                records = (synced + local)[-int(last_n):]
+            else:
+                # 不帶 LIMIT 時以 +row 排序 (不走 row 索引)：改用篩選條件的索引或循序掃描，再排序結果
+                records = fetch(sql + condition + "row IS NOT NULL ORDER BY +row", params) + local
+        return records, total
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "loaded_tabs": len(self._loaded),
+                "refreshes": self.refreshes,
+                "full_loads": self.full_loads,
+                "rows_loaded": self.rows_loaded,
+            }
+
+# 全域共用的鏡像 (資料來自全域的 SheetsCache)
+sheets_mirror = SheetsMirror()
@@ -0,0 +1,253 @@
+# services/sheets_writer.py
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from googleapiclient.errors import HttpError
+from services.google_api import get_google_service, SPREADSHEET_ID
+from services.local_storage import warn_if_ephemeral
+from services.sheets_cache import sheets_cache
+
+# 本地 Journal (append-only JSONL)；建議指向掛載的磁碟區，重啟後未寫入 Sheets 的資料會自動補送
+# (預設的 /tmp 在 Cloud Run 上存在記憶體中，執行個體結束即遺失；啟動時會印出警告)
+SHEETS_JOURNAL_PATH = os.getenv("SHEETS_JOURNAL_PATH", "/tmp/sheets_journal.jsonl")
+# 收到新資料後等待多久再送出 (秒)，期間的寫入合併為一批
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", 2.0))
+# 重試間隔上限 (秒)
+SHEETS_MAX_BACKOFF = 60
+# Journal 內容全部寫入後，超過此大小即清空
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# 可重試的 HTTP 狀態 (配額、逾時、伺服器錯誤)
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def _tab_of(range_name: str) -> str:
+    return range_name.split("!", 1)[0]
+
+class SheetsWriter:
+    """
+    Google Sheets 的 Write-behind 佇列。
+    - append() 寫入本地 Journal (fsync) 後立即回傳，不等 Sheets API
+    - 背景執行緒依 range 分組，每個頁籤一次 values().append 送出多列；遇到配額等錯誤以指數退避重試
+    - 請求 (對話、排程) 結束前呼叫 flush_pending 送出：Cloud Run 在回應後限制 CPU，背景執行緒不一定有機會執行
+    - 送出成功後在 Journal 寫入 commit 紀錄；啟動時補送未 commit 的資料
+      (至少一次：若在 API 成功後、commit 寫入前中斷，重啟後該批會再送一次)
+    - 尚未送出的資料列會疊加在 SheetsCache 的讀取結果後面 (SheetsMirror 亦由此取得)，讀取端看得到剛寫入的資料
+    """
+
+    def __init__(self, journal_path=SHEETS_JOURNAL_PATH, flush_interval=SHEETS_FLUSH_INTERVAL):
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # 同時只有一個 flush (避免同一批送出兩次)
+        self._wake = threading.Event()
+        self._pending = []      # [(id, range, row)]，依寫入順序
+        self._next_id = 1
+        self._thread = None
+        self._closed = False
+
+        self.written = 0        # 已寫入 Sheets 的列數
+        self.batches = 0        # API 呼叫次數
+        self.retries = 0
+        self.failed = 0         # 無法重試的列數 (保留於 <journal>.failed)
+
+        warn_if_ephemeral(journal_path, "Sheets 寫入 Journal", "SHEETS_JOURNAL_PATH")
+        self._recover()
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+        if self._pending:
+            self._start()
+            self._wake.set()
+        atexit.register(self.close)
+
+    # --- Journal ---
+    def _recover(self):
+        """讀取 Journal，找出尚未 commit 的資料，並改寫為只包含這些資料的精簡版本。"""
+        if not os.path.exists(self.journal_path): return
+        appends, done = {}, set()
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 寫到一半中斷的最後一行
+                if record["op"] == "append":
+                    appends[record["id"]] = (record["range"], record["row"])
+                else:
+                    done.update(record["ids"])
+
+        self._pending = [(i, r, row) for i, (r, row) in sorted(appends.items()) if i not in done]
+        self._next_id = max(appends, default=0) + 1
+        self._rewrite()
+        if self._pending:
+            print(f"Sheets Journal：補送 {len(self._pending)} 筆尚未寫入的資料", flush=True)
+
+    def _rewrite(self):
+        """以暫存檔 + os.replace 原子性地改寫 Journal (只保留待送資料)。"""
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for i, range_name, row in self._pending:
+                f.write(json.dumps({"op": "append", "id": i, "range": range_name, "row": row}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _write(self, record):
+        """(持有 _lock 時呼叫) 寫入一筆 Journal 紀錄並 fsync。"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    # --- 寫入 ---
+    def append(self, range_name: str, row: list) -> int:
+        """排入一列資料 (例如 append("workout_history!A:E", [...]))；寫入 Journal 後立即回傳編號。"""
+        with self._lock:
+            record_id = self._next_id
+            self._next_id += 1
+            self._write({"op": "append", "id": record_id, "range": range_name, "row": row})
+            self._pending.append((record_id, range_name, row))
+        self._start()
+        self._wake.set()
+        return record_id
+
+    def pending_rows(self, tab: str):
+        """尚未送出的資料列 (讀取時疊加在 Sheets 資料後面)。"""
+        with self._lock:
+            return [list(row) for _, range_name, row in self._pending if _tab_of(range_name) == tab]
+
+    def _start(self):
+        if self._thread is not None: return
+        with self._lock:
+            if self._thread is not None or self._closed: return
+            self._thread = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+            self._thread.start()
+
+    # --- 背景送出 ---
+    def _run(self):
+        backoff = 1
+        while not self._closed:
+            self._wake.wait()
+            # 合併視窗：等待期間的寫入一起送出
+            time.sleep(self.flush_interval)
+            self._wake.clear()
+            if self._closed: break
+            if self.flush():
+                backoff = 1
+            else:
+                self.retries += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, SHEETS_MAX_BACKOFF)
+                self._wake.set()
+
+    def flush(self) -> bool:
+        """將待送資料依 range 分組寫入 Sheets；全部完成回傳 True，需要稍後重試則回傳 False。"""
+        with self._flush_lock:
+            if self._file is None: return False
+            return self._flush()
+
+    def flush_pending(self) -> bool:
+        """
+        (請求結束前呼叫) 有待送資料時立即送出，不等合併視窗；沒有待送資料則直接回傳 True。
+        送出失敗的資料仍留在 Journal，由背景執行緒重試。
+        """
+        with self._lock:
+            if not self._pending: return True
+        return self.flush()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        先送出目前的待送資料，並在 with 區塊內暫停背景送出 (例如改寫整個頁籤時)。
+        as 取得是否已全部送出。
+        """
+        with self._flush_lock:
+            yield self._file is not None and self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch = list(self._pending)
+        if not batch: return True
+
+        service = get_google_service('sheets', 'v4')
+        if not service: return False
+
+        groups = {}
+        for record_id, range_name, row in batch:
+            groups.setdefault(range_name, []).append((record_id, row))
+
+        for range_name, items in groups.items():
+            ids = [record_id for record_id, _ in items]
+            try:
+                service.spreadsheets().values().append(
+                    spreadsheetId=SPREADSHEET_ID, range=range_name,
+                    valueInputOption="USER_ENTERED", insertDataOption="INSERT_ROWS",
+                    body={'values': [row for _, row in items]}
+                ).execute()
+            except HttpError as e:
+                if e.resp.status in _RETRYABLE_STATUS:
+                    print(f"Sheets 寫入暫時失敗 ({range_name}, HTTP {e.resp.status})，稍後重試", flush=True)
+                    return False
+                # 請求本身有誤 (例如頁籤不存在)：重試也不會成功，移到 .failed 檔保留
+                print(f"Sheets 寫入失敗，移至 {self.journal_path}.failed ({len(ids)} 筆, {range_name}): {e}", flush=True)
+                self._dead_letter(range_name, [row for _, row in items], str(e))
+                self._done(ids, range_name, "failed")
+                self.failed += len(ids)
+                continue
+            except Exception as e:
+                # 連線錯誤等：稍後重試
+                print(f"Sheets 寫入暫時失敗 ({range_name}): {e}", flush=True)
+                return False
+            self._done(ids, range_name, "commit")
+            self.written += len(ids)
+            self.batches += 1
+        return True
+
+    def _dead_letter(self, range_name, rows, error):
+        with open(self.journal_path + ".failed", "a", encoding="utf-8") as f:
+            f.write(json.dumps({"range": range_name, "rows": rows, "error": error}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _done(self, ids, range_name, op):
+        """記錄完成 (commit / failed) 並從待送清單移除。"""
+        record = {"op": op, "ids": ids}
+        done = set(ids)
+        with self._lock:
+            self._write(record)
+            self._pending = [p for p in self._pending if p[0] not in done]
+            # 全部寫入後清空過大的 Journal
+            if not self._pending and self._file.tell() > JOURNAL_COMPACT_BYTES:
+                self._file.close()
+                self._rewrite()
+                self._file = open(self.journal_path, "a", encoding="utf-8")
+        # 只有新增列：append-only 頁籤下次讀取只抓新增的部分
+        sheets_cache.expire(_tab_of(range_name))
+
+    def close(self):
+        """(行程結束時) 嘗試送出剩餘資料；未送出的仍保留在 Journal，下次啟動補送。"""
+        if self._closed: return
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Sheets 寫入結束前送出失敗 (保留於 Journal): {e}", flush=True)
+        with self._flush_lock, self._lock:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+# 全域共用的寫入佇列；讀取快取疊加尚未送出的資料
+sheets_writer = SheetsWriter()
+sheets_cache.pending = sheets_writer.pending_rows
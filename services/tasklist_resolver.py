@@ -0,0 +1,88 @@
+# services/tasklist_resolver.py
+import threading
+
+def _normalize(title: str) -> str:
+    return (title or "").strip().casefold()
+
+class TaskListResolver:
+    """
+    Google Tasks 清單名稱 -> ID 的快取解析器。
+    - 清單標題與 ID 只在查不到時才重新抓取 (tasklists().list)
+    - 別名以預先建立的字典查詢；字典查不到才做一次子字串比對，結果記住不再重算
+    - 記錄省下的 API 往返次數
+    """
+
+    def __init__(self, aliases: dict, default_title: str):
+        self.default_title = default_title
+        # 別名 (正規化) -> 實際清單名稱；實際名稱本身也可直接查到
+        self._aliases = {_normalize(k): v for k, v in aliases.items()}
+        self._aliases.update({_normalize(v): v for v in aliases.values()})
+        self._alias_keys = list(self._aliases)   # 子字串比對用 (保留原本順序)
+        self._titles = None     # 正規化標題 -> ID (None 表示尚未抓取)
+        self._resolved = {}     # 正規化查詢字串 -> ID (本次抓取結果有效期間)
+        self._lock = threading.Lock()
+
+        self.fetches = 0
+        self.saved_round_trips = 0
+
+    def real_title(self, list_title: str) -> str:
+        """別名 -> 實際清單名稱 (查不到則回傳原字串)。"""
+        key = _normalize(list_title)
+        if key in self._aliases: return self._aliases[key]
+        # 與原本 LIST_MAPPING 相同：查詢字串包含別名即視為該清單
+        for alias in self._alias_keys:
+            if alias in key: return self._aliases[alias]
+        return list_title.strip()
+
+    def _fetch(self, service):
+        titles, page_token = {}, None
+        while True:
+            result = service.tasklists().list(maxResults=100, pageToken=page_token).execute()
+            for item in result.get('items', []):
+                titles[_normalize(item['title'])] = item['id']
+            page_token = result.get('nextPageToken')
+            if not page_token: break
+        self._titles = titles
+        self._resolved = {}
+        self.fetches += 1
+
+    def resolve(self, service, list_title: str) -> str:
+        """
+        回傳清單 ID。查不到指定清單時退回預設清單 (default_title)，再不然使用 "@default"。
+        只有在快取中找不到時才呼叫 API。
+        """
+        key = _normalize(list_title)
+        with self._lock:
+            if self._titles is not None and key in self._resolved:
+                self.saved_round_trips += 1
+                return self._resolved[key]
+
+            # 第一次查詢這個名稱 (或清單重新抓取後)：對應結果隨後記住，只在這裡印出
+            real_title = self.real_title(list_title)
+            print(f"查詢清單 '{list_title}' -> 對應為 '{real_title}'")
+            real_key = _normalize(real_title)
+            if self._titles is not None and real_key in self._titles:
+                self.saved_round_trips += 1
+            else:
+                # 快取中沒有 (或尚未抓取)：重新抓取一次
+                self._fetch(service)
+
+            tasklist_id = (self._titles.get(real_key)
+                           or self._titles.get(_normalize(self.default_title))
+                           or "@default")
+            self._resolved[key] = tasklist_id
+            return tasklist_id
+
+    def invalidate(self):
+        """清單可能已被刪除或改名 (例如 API 回傳 404) 時呼叫，下次查詢重新抓取。"""
+        with self._lock:
+            self._titles = None
+            self._resolved = {}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lists": len(self._titles or {}),
+                "fetches": self.fetches,
+                "saved_round_trips": self.saved_round_trips,
+            }
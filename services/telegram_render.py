@@ -0,0 +1,196 @@
+# services/telegram_render.py
+"""
+將模型回覆轉為合法的 Telegram HTML，並處理 4096 字的訊息長度上限。
+- render_reply：以整段的 re.sub / str.replace 完成格式轉換、跳脫與圖片標籤擷取；
+  只有回覆中含 Telegram 標籤 / 連結時，才逐一配對這些標籤 (其餘文字不經 Python 迴圈)
+- split_html：在安全的位置 (換行 > 空白 > 字元) 分段，且不會切斷標籤
+"""
+import re
+
+TELEGRAM_LIMIT = 4096
+
+# Telegram 支援的 HTML 標籤 (其餘一律跳脫為文字)
+_ALLOWED_TAGS = "b|strong|i|em|u|ins|s|strike|del|code|pre|tg-spoiler|blockquote"
+# Telegram 接受的實體：具名實體只有這四個 (區分大小寫)，數字實體皆可；其他的 & 一律跳脫
+# (&nbsp;、R&D; 會讓 Telegram 回傳 BadRequest)
+_ENTITY = r"(?:lt|gt|amp|quot|#\d+|#x[0-9a-fA-F]+);"
+
+# 轉換過程使用的佔位字元：粗體開始 / 結束、移除的片段、保留標籤的 < 與 >
+# 先換成佔位字元可避免前後文字接起來形成新的結構，也讓保留的標籤不被跳脫；最後再換回
+_PLACEHOLDERS = ("\x01", "\x02", "\x03", "\x04", "\x05")
+_PLACEHOLDER_RE = re.compile(r"[\x01-\x05]")
+
+# 需要配對的標籤 / 連結 (寬鬆比對：可能誤判為有，但不會漏掉)
+_STATEFUL_RE = re.compile(r"<(?:/?(?:" + _ALLOWED_TAGS + r")>|a\s|/a>)", re.IGNORECASE)
+_IMG_RE = re.compile(r"<<<IMG:(.*?)>>>", re.IGNORECASE)
+_HREF_RE = re.compile(r"<a\s+href=\"([^\"<>]*)\">", re.IGNORECASE)
+_BOLD_RE = re.compile(r"\*\*(.*?)\*\*")
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_LI_RE = re.compile(r"<li>", re.IGNORECASE)
+_DROP_RE = re.compile(r"</?ul>|</li>", re.IGNORECASE)
+_FENCE_RE = re.compile(r"```(?:html)?", re.IGNORECASE)
+_STRAY_AMP_RE = re.compile(r"&(?!" + _ENTITY + r")")
+# 標籤配對：含 < 的粗體 (內部另行配對)、Telegram 標籤、連結 (網址已由 _quote_href 處理，不含佔位字元)
+# 不含 < 的粗體不會比對到，其內容也不可能開啟或關閉標籤
+_TAG_RE = re.compile(
+    r"\x01(?P<bold>[^\x02<]*<[^\x02]*)\x02"
+    r"|<(?P<close>/)?(?P<tag>" + _ALLOWED_TAGS + r")>"
+    r"|<a\s+href=\"(?P<href>[^\"<>\x01-\x05]*)\">"
+    r"|(?P<close_a></a>)",
+    re.IGNORECASE
+)
+# 網址中會被其他轉換誤認的字元 (粗體、項目符號、程式碼區塊)
+_HREF_QUOTE = str.maketrans({"*": "%2A", " ": "%20", "`": "%60"})
+
+# 分段用：標籤、實體、換行、其他文字
+_ATOM_RE = re.compile(r"<[^>]*>|&[^;\s]*;|\n|[^<&\n]+|.")
+_TAG_NAME_RE = re.compile(r"</?([a-zA-Z-]+)")
+
+def _bold_placeholder(m):
+    # Python 3.11 的 re.sub 替換字串含群組時反而較慢，改用極短的函式
+    return "\x01" + m[1] + "\x02"
+
+def _quote_href(m):
+    return f'<a href="{m[1].translate(_HREF_QUOTE)}">'
+
+def _balance_tags(text):
+    """
+    (粗體已換成佔位字元，尚未跳脫 < >) 配對 Telegram 標籤與連結，保留的標籤以 \\x04 \\x05 取代 < >：
+    - 結尾只接受與最內層開啟標籤相符者，否則留作文字 (之後跳脫)
+    - 粗體內的標籤獨立配對並在粗體結束前關閉，粗體外的標籤不能在粗體內關閉
+    - 最後補上未關閉的標籤
+    """
+    stack = []   # 開啟中的標籤名稱
+
+    def replace(m):
+        kind = m.lastgroup
+        if kind == "tag":
+            name = m["tag"].lower()
+            if not m["close"]:
+                stack.append(name)
+                return f"\x04{name}\x05"
+            if stack and stack[-1] == name:
+                stack.pop()
+                return f"\x04/{name}\x05"
+            return m[0]
+        if kind == "close_a":
+            if stack and stack[-1] == "a":
+                stack.pop()
+                return "\x04/a\x05"
+            return m[0]
+        if kind == "href":
+            stack.append("a")
+            return f'\x04a href="{m["href"]}"\x05'
+        return "\x01" + _balance_tags(m["bold"]) + "\x02"
+
+    text = _TAG_RE.sub(replace, text)
+    return text + "".join(f"\x04/{name}\x05" for name in reversed(stack))
+
+def render_reply(text: str):
+    """
+    模型回覆 -> Telegram HTML。
+    回傳 (HTML 文字, 第一個圖片標籤的網址或 None)；所有 <<<IMG:...>>> 標籤都會從文字中移除。
+    各步驟只在回覆中出現相關字元時執行。
+    """
+    if any(c in text for c in _PLACEHOLDERS): text = _PLACEHOLDER_RE.sub("", text)
+    tagged = "<" in text and _STATEFUL_RE.search(text) is not None
+    images = _IMG_RE.findall(text) if "<<<" in text else []
+    if images: text = _IMG_RE.sub("\x03", text)
+    if tagged: text = _HREF_RE.sub(_quote_href, text)
+    text = text.replace("- ", "• ")
+    if "**" in text: text = _BOLD_RE.sub(_bold_placeholder, text)
+    if "<" in text: text = _DROP_RE.sub("\x03", _LI_RE.sub("• ", _BR_RE.sub("\n", text)))
+    if "`" in text: text = _FENCE_RE.sub("\x03", text)
+    if tagged: text = _balance_tags(text)
+    if "&" in text: text = _STRAY_AMP_RE.sub("&amp;", text)
+    text = text.replace("<", "&lt;").replace(">", "&gt;")
+    text = text.replace("\x01", "<b>").replace("\x02", "</b>").replace("\x03", "")
+    if tagged: text = text.replace("\x04", "<").replace("\x05", ">")
+    return text.strip(), (images[0].strip() if images else None)
+
+def render_partial(text: str) -> str:
+    """串流中的部分回覆：隱藏尚未完整的圖片標籤後套用相同轉換。"""
+    cut = text.rfind("<<<")
+    if cut != -1 and ">>>" not in text[cut:]:
+        text = text[:cut]
+    return render_reply(text)[0]
+
+def split_html(html: str, limit: int = TELEGRAM_LIMIT):
+    """
+    將 Telegram HTML 切成多段，每段長度 <= limit。
+    優先在換行處切，其次空白，最後才在字元間硬切；
+    分段處會關閉開啟中的標籤，並在下一段重新開啟。
+    """
+    if len(html) <= limit: return [html]
+
+    chunks = []
+    buf, size = [], 0
+    # 開啟中的標籤 (不可變 tuple，可直接記錄在切點中)：((名稱, 開啟標籤原文), ...)
+    stack, close_len = (), 0
+    newline = None            # 最近的換行切點：(buf 位置, size, stack)
+
+    def closing(tags):
+        return "".join(f"</{name}>" for name, _ in reversed(tags))
+
+    def cut():
+        """在最近的換行 (沒有則在目前位置) 分段；之後的內容移到下一段開頭並重新開啟標籤。"""
+        nonlocal buf, size, newline
+        idx, cut_size, tags = newline or (len(buf), size, stack)
+        chunks.append(("".join(buf[:idx]) + closing(tags)).strip())
+        reopen = [open_tag for _, open_tag in tags]
+        buf = reopen + buf[idx:]
+        size = size - cut_size + sum(map(len, reopen))
+        newline = None
+
+    def push(atom, new_stack, new_close_len):
+        nonlocal size, stack, close_len
+        # 放不下就先分段 (至少保留開啟標籤以外的內容才切)
+        while size + len(atom) + new_close_len > limit and len(buf) > len(stack):
+            cut()
+        buf.append(atom)
+        size += len(atom)
+        stack, close_len = new_stack, new_close_len
+
+    for atom in _ATOM_RE.findall(html):
+        first = atom[0]
+        # 快速路徑：一般文字且放得下
+        if first != "<" and size + len(atom) + close_len <= limit:
+            buf.append(atom)
+            size += len(atom)
+            if first == "\n": newline = (len(buf), size, stack)
+            continue
+
+        if first == "<":
+            m = _TAG_NAME_RE.match(atom)
+            name = m.group(1).lower() if m else ""
+            if atom[1:2] == "/":
+                if stack and stack[-1][0] == name:
+                    push(atom, stack[:-1], close_len - len(name) - 3)
+                else:
+                    push(atom, stack, close_len)
+            else:
+                push(atom, stack + ((name, atom),), close_len + len(name) + 3)
+            continue
+
+        # 放不下的文字：先試換行切點，其次在剩餘空間內找最後一個空白，都沒有才硬切
+        while size + len(atom) + close_len > limit and first not in "&\n":
+            room = limit - size - close_len
+            if newline or room <= 0:
+                # 開啟中的標籤 (重新開啟 + 關閉) 本身就超過上限：再切也沒有進展，整段放入
+                if not newline and len(buf) <= len(stack): break
+                cut()
+                continue
+            space = atom.rfind(" ", 0, room)
+            take = space + 1 if space > 0 else room
+            push(atom[:take], stack, close_len)
+            atom = atom[take:]
+            cut()
+        if not atom: continue
+
+        push(atom, stack, close_len)
+        if first == "\n":
+            newline = (len(buf), size, stack)
+
+    tail = ("".join(buf) + closing(stack)).strip()
+    if tail: chunks.append(tail)
+    return [c for c in chunks if c]
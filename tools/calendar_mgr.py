@@ -1,24 +1,22 @@
 # tools/calendar_mgr.py
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from services.google_api import get_google_service
+from services.calendar_directory import calendar_directory
 from zoneinfo import ZoneInfo
 
+# 各日曆平行查詢；超過逾時 (秒) 的日曆直接略過，不拖慢整份行程總覽
+CALENDAR_FETCH_TIMEOUT = float(os.getenv("CALENDAR_FETCH_TIMEOUT", 5))
+_calendar_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="calendar")
+
 def _get_calendar_id_by_name(service, name_keyword):
-    """(內部工具) 根據關鍵字搜尋日曆 ID"""
+    """(內部工具) 根據關鍵字搜尋日曆 ID (使用快取的日曆目錄，通常不需呼叫 API)"""
     try:
-        # 取得所有日曆
-        page_token = None
-        while True:
-            calendar_list = service.calendarList().list(pageToken=page_token).execute()
-            for calendar_list_entry in calendar_list['items']:
-                # 比對日曆名稱 (Summary)
-                if name_keyword in calendar_list_entry['summary']:
-                    return calendar_list_entry['id']
-            page_token = calendar_list.get('nextPageToken')
-            if not page_token:
-                break
-        return None
-    except:
+        return calendar_directory.find_id(service, name_keyword)
+    except Exception as e:
+        print(f"查詢日曆目錄失敗: {e}")
         return None
 
 def add_calendar_event(summary: str, start_time: str, duration_minutes: int = 60, description: str = "", remind_minutes: int = 0, target_calendar: str = None):
@@ -77,11 +75,33 @@ def add_calendar_event(summary: str, start_time: str, duration_minutes: int = 60
     except Exception as e:
         return f"建立活動失敗: {e}"
 
+def _event_start(event):
+    return event['start'].get('dateTime', event['start'].get('date'))
+
+def _fetch_calendar_events(cal_id, summary_name, time_min, time_max):
+    """(於工作執行緒執行) 查詢單一日曆的活動，並注入來源日曆名稱。"""
+    service = get_google_service('calendar', 'v3')
+    if not service: raise RuntimeError("無法連線至 Google Calendar")
+    events_result = service.events().list(
+        calendarId=cal_id, 
+        timeMin=time_min, 
+        timeMax=time_max,
+        maxResults=10, # 每個日曆最多抓10筆，避免爆量
+        singleEvents=True, 
+        orderBy='startTime'
+    ).execute()
+
+    items = events_result.get('items', [])
+    # 將日曆名稱注入到 event 物件中，方便後續顯示
+    for item in items:
+        item['source_calendar'] = summary_name
+    return items
+
 def get_upcoming_events(days: int = 1):
     """
     讀取 Google 日曆上未來幾天的行程 (包含所有已勾選的日曆)。
-    1. 遍歷帳號下所有 Calendar List。
-    2. 合併不同日曆的行程並依時間排序。
+    1. 從快取的日曆目錄取得所有勾選顯示的日曆，平行查詢各日曆 (逾時的日曆略過並註明)。
+    2. 以 k-way merge 合併不同日曆 (已各自排序) 的行程。
     3. 顯示時標註來源日曆名稱，例如 [工作] 或 [家庭]。
     """
     service = get_google_service('calendar', 'v3') 
@@ -93,56 +113,40 @@ def get_upcoming_events(days: int = 1):
         end_date = now + timedelta(days=days)
         time_max = end_date.isoformat()
 
-        # 取得所有日曆列表
-        # minAccessRole='owner' 或 'writer' 可以只抓自己的，
-        # 但為了包含訂閱的日曆(如公司共用)，我們先抓全部，再用 selected 過濾
-        cal_list_result = service.calendarList().list().execute()
-        calendars = cal_list_result.get('items', [])
-
-        all_events = []
-
-        # 遍歷每一個日曆
-        for cal in calendars:
-            # 過濾 A: 只讀取 Google 日曆介面上「有勾選顯示」的日曆
-            if not cal.get('selected', False): 
-                continue
-            
-            # 過濾 B: 排除一些通常不需要 AI 報告的系統日曆 (可依需求調整)
+        # 取得要查詢的日曆 (快取的日曆目錄：只含 Google 日曆介面上「有勾選顯示」且未隱藏的日曆)
+        targets = []
+        for cal_id, summary_name in calendar_directory.visible_calendars(service):
+            # 排除一些通常不需要 AI 報告的系統日曆 (可依需求調整)
             # 例如: "addressbook#contacts@group.v.calendar.google.com" 是聯絡人生日
             # "zh-tw.taiwan#holiday@group.v.calendar.google.com" 是台灣假期
-            cal_id = cal['id']
-            summary_name = cal['summary']
             if "contacts@group.v.calendar.google.com" in cal_id: continue
             if "holiday@group.v.calendar.google.com" in cal_id: continue
+            targets.append((cal_id, summary_name))
 
-            # 查詢該日曆的活動
+        # 平行查詢各日曆的活動 (每個工作執行緒使用自己的 Client)
+        futures = {
+            _calendar_executor.submit(_fetch_calendar_events, cal_id, summary_name, time_min, time_max): summary_name
+            for cal_id, summary_name in targets
+        }
+        done, not_done = wait(futures, timeout=CALENDAR_FETCH_TIMEOUT)
+        skipped = [futures[f] for f in not_done]
+        for f in not_done: f.cancel()
+
+        event_lists = []
+        for f in done:
             try:
-                events_result = service.events().list(
-                    calendarId=cal_id, 
-                    timeMin=time_min, 
-                    timeMax=time_max,
-                    maxResults=10, # 每個日曆最多抓10筆，避免爆量
-                    singleEvents=True, 
-                    orderBy='startTime'
-                ).execute()
-                
-                items = events_result.get('items', [])
-                
-                # 將日曆名稱注入到 event 物件中，方便後續顯示
-                for item in items:
-                    item['source_calendar'] = summary_name
-                    all_events.append(item)
-                    
+                event_lists.append(f.result())
             except Exception as e:
-                print(f"略過日曆 {summary_name}: {e}")
-                continue
-            
-        if not all_events: return f"接下來 {days} 天內沒有安排行程。"
-        
-        # 重新排序：因為是分開抓的，必須把所有活動混在一起按時間重排
+                print(f"略過日曆 {futures[f]}: {e}")
+                skipped.append(futures[f])
+
+        # 各日曆的結果已依開始時間排序，以 k-way merge 一次合併
         # Key: 優先抓 dateTime (精確時間), 沒有則抓 date (全天)
-        all_events.sort(key=lambda x: x['start'].get('dateTime', x['start'].get('date')))
+        all_events = list(heapq.merge(*event_lists, key=_event_start))
+        skipped_note = f"(略過回應過慢或失敗的日曆：{'、'.join(skipped)})\n" if skipped else ""
 
+        if not all_events: return f"接下來 {days} 天內沒有安排行程。\n{skipped_note}".strip()
+        
         # 格式化輸出
         formatted_events = f"<b>【未來 {days} 天的行程總覽】</b>\n"
 
@@ -166,7 +170,7 @@ def get_upcoming_events(days: int = 1):
             # 如果是主日曆(通常顯示為 Email)，可以簡化顯示名稱，或者就保留顯示區隔
             formatted_events += f"• {start_str} [{cal_name}] {summary}\n"
             
-        return formatted_events
+        return formatted_events + skipped_note
 
     except Exception as e:
         return f"讀取行程失敗: {e}"
\ No newline at end of file
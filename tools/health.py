@@ -1,113 +1,184 @@
 # tools/health.py
+import re
 from datetime import datetime
-from services.google_api import get_google_service, SPREADSHEET_ID
+from services.google_api import get_google_service
+from services.sheets_cache import sheets_cache
+from services.sheets_mirror import sheets_mirror, normalize_date
+from services.sheets_writer import sheets_writer
+from services.profile_index import profile_index
+from services.sheet_records import COLUMN_LABELS
 
-def read_sheet_data(sheet_name: str):
-    """從記憶庫讀取特定的資料表。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
-    
-    valid_sheets = ["training", "health_profile", "workout_history", "food_properties", "recipes"]
-    if sheet_name not in valid_sheets: return f"錯誤：不支援的頁籤名稱 '{sheet_name}'。"
+# 篩選條件對應的欄位 index
+_DATE_COLUMN = {"health_profile": 0, "workout_history": 0}
+_MUSCLE_COLUMN = {"training": 0, "workout_history": 1}
+_SEASON_COLUMN = {"recipes": 2}
+# 季節欄為以下值時，任何季節都符合
+_ALL_SEASONS = ("四季", "全年", "不限")
+
+def _img_info(url):
+    url = str(url).strip()
+    return f" | IMG_URL: {url}" if url else ""
+
+# 各頁籤的預設格式：(說明列, 紀錄 list -> 文字列 list)；紀錄見 services/sheet_records.py
+# 以 comprehension 直接拆開 tuple (欄位順序同 NamedTuple)，不必每列呼叫函式、查屬性
+_SHEET_FORMATS = {
+    "training": ("格式：[肌群] 動作名稱 (強度:/10) : 注意事項 | IMG_URL",
+                 lambda rs: [f"- [{part}] {exercise} (強度:{intensity}) : {note} | {_img_info(image_url) if image_url else ''}"
+                             for part, exercise, intensity, note, image_url in rs]),
+    "health_profile": ("格式：日期 | HP | 體質 | 變化 | 細節",
+                       lambda rs: [f"- {day} | HP:{hp} | 體質:{constitution} | 變化:{changes} | 細節:{details}"
+                                   for day, hp, constitution, changes, details in rs]),
+    "food_properties": ("格式：食材 - 性味 - 忌諱體質",
+                        lambda rs: [f"- {ingredient}: {nature} (忌:{avoid_for})"
+                                    for ingredient, nature, avoid_for, _ in rs]),
+    "workout_history": ("格式：日期 - 菜單 - RPE - 調整建議",
+                        lambda rs: [f"- {day}: {menu} (RPE:{rpe}) | 建議:{adjustment}"
+                                    for day, menu, rpe, adjustment, _ in rs]),
+    "recipes": ("格式：菜名 (食材 / 季節/ 標籤) - 連結 | IMG_URL",
+                lambda rs: [f"- {name} ({main_ingredient} / {season} / {tags}) - {link} | {_img_info(image_url) if image_url else ''}"
+                            for name, main_ingredient, season, tags, link, image_url, _ in rs]),
+}
+
+def _build_query(sheet_name, last_n=0, start_date="", end_date="", muscle_group="", season=""):
+    """
+    篩選參數 -> 查詢條件 {"date_range", "contains", "last_n"} (SheetsMirror.query 的參數)；
+    條件不適用於該頁籤時拋出 ValueError。
+    """
+    query = {"date_range": None, "contains": [], "last_n": int(last_n or 0)}
+    if start_date or end_date:
+        if sheet_name not in _DATE_COLUMN:
+            raise ValueError(f"頁籤 '{sheet_name}' 沒有日期欄位，無法使用 start_date / end_date")
+        start = normalize_date(start_date) if start_date else None
+        end = normalize_date(end_date) if end_date else None
+        if (start_date and not start) or (end_date and not end):
+            raise ValueError("日期格式需為 YYYY-MM-DD")
+        query["date_range"] = (start, end)
+
+    if muscle_group:
+        if sheet_name not in _MUSCLE_COLUMN:
+            raise ValueError(f"頁籤 '{sheet_name}' 不支援 muscle_group 篩選")
+        query["contains"].append((_MUSCLE_COLUMN[sheet_name], muscle_group.strip(), ()))
+
+    if season:
+        if sheet_name not in _SEASON_COLUMN:
+            raise ValueError(f"頁籤 '{sheet_name}' 不支援 season 篩選")
+        key = season.strip().rstrip("季天") or season.strip()
+        query["contains"].append((_SEASON_COLUMN[sheet_name], key, _ALL_SEASONS))
+    return query
+
+def _filter_records(sheet_name, records, date_range=None, contains=(), last_n=0):
+    """(鏡像無法使用時) 在記憶體中對紀錄套用 _build_query 的條件。"""
+    if date_range:
+        col, (start, end) = _DATE_COLUMN[sheet_name], date_range
+        filtered = []
+        for record in records:
+            day = normalize_date(record[col])
+            if day is None: continue
+            if start and day < start: continue
+            if end and day > end: continue
+            filtered.append(record)
+        records = filtered
+
+    for col, key, alternatives in contains:
+        key = key.casefold()
+        records = [r for r in records
+                   if key in str(r[col]).casefold() or any(s in str(r[col]) for s in alternatives)]
+
+    if last_n > 0:
+        records = records[-last_n:]
+    return records
+
+def _select_columns(sheet_name, columns: str):
+    """'日期,RPE' -> 欄位 index 清單；有不存在的欄位名稱時拋出 ValueError。"""
+    names = COLUMN_LABELS[sheet_name]
+    lookup = {name.casefold(): i for i, name in enumerate(names)}
+    selected = []
+    for name in re.split(r"[,，、\s]+", columns.strip()):
+        if not name: continue
+        if name.casefold() not in lookup:
+            raise ValueError(f"頁籤 '{sheet_name}' 沒有欄位 '{name}'，可用欄位：{'、'.join(names)}")
+        selected.append(lookup[name.casefold()])
+    return selected
+
+def read_sheet_data(sheet_name: str, last_n: int = 0, start_date: str = "", end_date: str = "",
+                    muscle_group: str = "", season: str = "", columns: str = ""):
+    """
+    從記憶庫讀取特定的資料表，可只取需要的資料列與欄位 (未指定條件則回傳全部)。
+    參數:
+    - sheet_name: 頁籤名稱
+    - last_n: 只取最後 N 筆 (套用其他篩選條件之後)
+    - start_date / end_date: 日期範圍 YYYY-MM-DD (含)，限 health_profile、workout_history
+    - muscle_group: 肌群關鍵字，限 training (部位)、workout_history (菜單)
+    - season: 季節，限 recipes (季節欄為「四季」的食譜也會列出)
+    - columns: 只回傳的欄位，以逗號分隔，例如 "日期,RPE"
+    """
+    if sheet_name not in _SHEET_FORMATS: return f"錯誤：不支援的頁籤名稱 '{sheet_name}'。"
 
     try:
-        range_name = f"{sheet_name}!A:E"
-        # 個別設定讀取欄位
-        if sheet_name == "recipes": range_name = f"{sheet_name}!A:G"
-        elif sheet_name == "food_properties": range_name = f"{sheet_name}!A:D"
-
-        result = service.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range=range_name).execute()
-        rows = result.get('values', [])
-        if not rows: return f"頁籤 '{sheet_name}' 是空的。"
-        # 避開標題列
-        data_rows = rows[1:]
-        
-        formatted_text = f"【資料庫讀取：{sheet_name}】\n"
-        
-        if sheet_name == "training":
-            # 欄位：[0]部位, [1]動作, [2]強度, [3]備註, [4]圖片連結
-            formatted_text += "格式：[肌群] 動作名稱 (強度:/10) : 注意事項 | IMG_URL\n"
-            for row in data_rows:
-                # 補齊空欄位避免 index out of range
-                while len(row) < 5: row.append("")
-                # 讀取圖片欄位 E 欄 [4]
-                img_url = row[4].strip()
-                img_info = f" | IMG_URL: {img_url}" if img_url else ""
-                formatted_text += f"- [{row[0]}] {row[1]} (強度:{row[2]}) : {row[3]} | {img_info}\n"
-                
-        elif sheet_name == "health_profile":
-            formatted_text += "格式：日期 | HP | 體質 | 變化 | 細節\n"
-            for row in data_rows:
-                while len(row) < 5: row.append("") 
-                formatted_text += f"- {row[0]} | HP:{row[1]} | 體質:{row[2]} | 變化:{row[3]} | 細節:{row[4]}\n"
-
-        elif sheet_name == "food_properties":
-            formatted_text += "格式：食材 - 性味 - 忌諱體質\n"
-            for row in data_rows:
-                while len(row) < 3: row.append("")
-                formatted_text += f"- {row[0]}: {row[1]} (忌:{row[2]})\n"
-        
-        elif sheet_name == "workout_history":
-            formatted_text += "格式：日期 - 菜單 - RPE - 調整建議\n"
-            for row in data_rows:
-                while len(row) < 5: row.append("")
-                formatted_text += f"- {row[0]}: {row[1]} (RPE:{row[2]}) | 建議:{row[3]}\n"
-        
-        elif sheet_name == "recipes":
-            # 欄位：[0]菜名, [1]主食材, [2]季節, [3]標籤, [4]食譜連結, [5]圖片連結, [6]備註
-            formatted_text += "格式：菜名 (食材 / 季節/ 標籤) - 連結 | IMG_URL\n"
-            for row in data_rows:
-                while len(row) < 6: row.append("")
-                # 讀取圖片欄位 F 欄 [5]
-                img_url = row[5].strip()
-                img_info = f" | IMG_URL: {img_url}" if img_url else ""
-                formatted_text += f"- {row[0]} ({row[1]} / {row[2]} / {row[3]}) - {row[4]} | {img_info}\n"
-        return formatted_text
+        selected = _select_columns(sheet_name, columns) if columns else None
+        query = _build_query(sheet_name, last_n, start_date, end_date, muscle_group, season)
+
+        service = get_google_service('sheets', 'v4') 
+        if not service: return "錯誤：無法連線至 Google Sheets"
+        # 資料都來自 SheetsCache：有篩選條件時以鏡像 (快取紀錄的 SQLite 索引) 查詢，整張表直接使用快取的紀錄
+        filtered = bool(query["date_range"] or query["contains"] or query["last_n"] > 0)
+        result = sheets_mirror.query(service, sheet_name, **query) if filtered else None
+        if result is not None:
+            matched, total = result
+        else:
+            records = sheets_cache.get_records(service, sheet_name)
+            matched, total = _filter_records(sheet_name, records, **query), len(records)
+
+        if not total: return f"頁籤 '{sheet_name}' 是空的。"
+        if not matched: return f"頁籤 '{sheet_name}' 沒有符合條件的資料 (共 {total} 筆)。"
+
+        lines = [f"【資料庫讀取：{sheet_name}】"]
+        if len(matched) < total:
+            lines.append(f"(符合條件 {len(matched)} 筆 / 共 {total} 筆)")
+
+        if selected is None:
+            header, format_records = _SHEET_FORMATS[sheet_name]
+            lines.append(header)
+            lines.extend(format_records(matched))
+        else:
+            labels = COLUMN_LABELS[sheet_name]
+            lines.append("格式：" + " | ".join(labels[i] for i in selected))
+            lines.extend("- " + " | ".join(str(r[i]) for i in selected) for r in matched)
+        return "\n".join(lines) + "\n"
+    except ValueError as e: return f"錯誤：{e}"
     except Exception as e: return f"讀取失敗 (Error): {str(e)}"
 
 def log_workout_result(menu: str, rpe: int, note: str = ""):
     """記錄運動訓練成果。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
     try:
         today = datetime.now().strftime("%Y-%m-%d")
         adjustment = "強度過低" if rpe <= 4 else ("接近極限" if rpe >= 9 else "強度適中")
-        values = [[today, menu, rpe, adjustment, note]]
-        body = {'values': values}
-        service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID, range="workout_history!A:E",
-            valueInputOption="USER_ENTERED", body=body
-        ).execute()
+        # 寫入本地 Journal 後立即回傳，背景批次送出至 Sheets
+        sheets_writer.append("workout_history!A:E", [today, menu, rpe, adjustment, note])
         return f"訓練紀錄已歸檔。強度評估：{rpe}/10，建議：{adjustment}"
     except Exception as e: return f"記錄失敗: {str(e)}"
 
 def log_health_status(hp: int, constitution: str, changes: str = "", details: str = ""):
     """記錄每日身體數值。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
     try:
         today = datetime.now().strftime("%Y-%m-%d")
-        values = [[today, hp, constitution, changes, details]]
-        body = {'values': values}
-        service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID, range="health_profile!A:E",
-            valueInputOption="USER_ENTERED", body=body
-        ).execute()
+        # 寫入本地 Journal 後立即回傳，背景批次送出至 Sheets
+        sheets_writer.append("health_profile!A:E", [today, hp, constitution, changes, details])
         return f"已記錄健康狀態：HP={hp}, 體質={constitution}"
     except Exception as e: return f"記錄失敗: {str(e)}"
 
 def get_user_profile(domain: str = None):
-    """讀取 User Profile。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
+    """讀取 User Profile (每個屬性只列出最新的值)。"""
     try:
-        result = service.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range="user_profile!A:D").execute()
-        rows = result.get('values', [])
-        if not rows: return "設定檔是空的。"
+        # 整個頁籤：讀取記憶體快取 (快取有效期間沿用同一份紀錄，索引只處理新增的列)
+        service = get_google_service('sheets', 'v4') 
+        if not service: return "錯誤：無法連線至 Google Sheets"
+        records = sheets_cache.get_records(service, "user_profile")
+        if not records: return "設定檔是空的。"
         formatted_text = "【使用者個人檔案】\n"
-        for row in rows[1:]:
-            while len(row) < 3: row.append("")
-            dom, attr, val = row[0], row[1], row[2]
+        # 同一 (領域, 屬性) 只保留最新的值
+        for entry in profile_index.update(records):
+            dom, attr, val = entry.domain, entry.attribute, entry.value
             if domain and domain.lower() not in dom.lower(): continue
             formatted_text += f"- [{dom}] {attr}: {val}\n"
         return formatted_text
@@ -115,29 +186,17 @@ def get_user_profile(domain: str = None):
 
 def update_user_profile(domain: str, attribute: str, value: str):
     """更新 User Profile。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
     try:
         today = datetime.now().strftime("%Y-%m-%d")
-        values = [[domain, attribute, value, today]]
-        body = {'values': values}
-        service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID, range="user_profile!A:D",
-            valueInputOption="USER_ENTERED", body=body
-        ).execute()
+        # 寫入本地 Journal 後立即回傳，背景批次送出至 Sheets
+        sheets_writer.append("user_profile!A:D", [domain, attribute, value, today])
         return f"已更新設定檔：[{domain}] {attribute} -> {value}"
     except Exception as e: return f"更新失敗: {str(e)}"
 
 def add_recipe(name: str, main_ing: str, season: str, tags: str, link: str, note: str = ""):
     """將食譜存入 'recipes' 頁籤。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
     try:
-        values = [[name, main_ing, season, tags, link, note]]
-        body = {'values': values}
-        service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID, range="recipes!A:G",
-            valueInputOption="USER_ENTERED", body=body
-        ).execute()
+        # 寫入本地 Journal 後立即回傳，背景批次送出至 Sheets
+        sheets_writer.append("recipes!A:G", [name, main_ing, season, tags, link, note])
         return f"🍽️ 食譜已登錄：{name}"
     except Exception as e: return f"食譜儲存失敗: {str(e)}"
\ No newline at end of file
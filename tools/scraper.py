@@ -1,14 +1,20 @@
 # tools/scraper.py
-import requests
 from bs4 import BeautifulSoup
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime
 from services.google_api import get_google_service, SPREADSHEET_ID
+from services import http_client
+from services.sheets_cache import sheets_cache
+from services.sheets_mirror import sheets_mirror
+from services.sheets_writer import sheets_writer
 import urllib3
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# mark_inbox_as_read 一次最多標記的列數 (避免 "2-5000000" 這類範圍展開成巨大的列號集合)
+MAX_MARK_ROWS = 500
+
 def get_youtube_video_id(url):
     try:
         parsed = urlparse(url)
@@ -39,7 +45,7 @@ def scrape_web_content(url: str):
     # 策略 B: 一般網頁
     try:
         headers = {'User-Agent': 'Mozilla/5.0 ... Chrome/91.0'}
-        response = requests.get(url, headers=headers, timeout=10, verify=False)
+        response = http_client.get(url, headers=headers, timeout=(http_client.HTTP_CONNECT_TIMEOUT, 10), verify=False)
         response.encoding = response.apparent_encoding
         soup = BeautifulSoup(response.text, 'html.parser')
         title = soup.title.string.strip() if soup.title else "無標題"
@@ -50,9 +56,6 @@ def scrape_web_content(url: str):
 
 def save_to_inbox(url: str, note: str = ""):
     """將網頁連結儲存到 'inbox' 頁籤。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線至 Google Sheets"
-
     # 先爬取內容
     scrape_result = scrape_web_content(url)
     # 簡易解析標題 (假設 scrape_result 格式如上)
@@ -65,45 +68,91 @@ def save_to_inbox(url: str, note: str = ""):
 
     try:
         today = datetime.now().strftime("%Y-%m-%d")
-        values = [[today, url, title, note, "Unread"]]
-        body = {'values': values}
-        service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID, range="inbox!A:E",
-            valueInputOption="USER_ENTERED", body=body
-        ).execute()
+        # 寫入本地 Journal 後立即回傳，背景批次送出至 Sheets
+        sheets_writer.append("inbox!A:E", [today, url, title, note, "Unread"])
         return f"✅ 已收藏至 Inbox。\n{scrape_result[:200]}..."
     except Exception as e: return f"儲存失敗: {str(e)}"
 
 def get_unread_inbox(limit: int = 5):
     """讀取 Inbox 中尚未閱讀的項目。"""
-    service = get_google_service('sheets', 'v4') 
-    if not service: return "錯誤：無法連線"
     try:
-        result = service.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range="inbox!A:E").execute()
-        rows = result.get('values', [])
-        if not rows: return "Inbox 是空的。"
+        service = get_google_service('sheets', 'v4') 
+        if not service: return "錯誤：無法連線"
+        # 以鏡像查詢 (找到 limit 筆即停止)；鏡像停用時在記憶體中篩選快取的紀錄
+        unread = sheets_mirror.first_rows_not(service, "inbox", 4, "Read", int(limit))
+        if unread is None:
+            synced, pending = sheets_cache.get_synced(service, "inbox")
+            # 第 1 列是標題列；尚未寫入 Sheets 的項目沒有列號
+            unread = [(index, item) for index, item in enumerate(synced, start=2)
+                      if str(item.status).strip().lower() != "read"]
+            unread += [(None, item) for item in pending if str(item.status).strip().lower() != "read"]
+            unread = unread[:limit]
         unread_items = []
-        for index, row in enumerate(rows[1:], start=2):
-            while len(row) < 5: row.append("")
-            if row[4].strip().lower() != "read":
-                full_title = row[2]
-                display_title = full_title[:15] + "..." if len(full_title) > 15 else full_title
-                unread_items.append(f"• [{index}] {display_title}\n  ({row[1]})")
-            if len(unread_items) >= limit: break
+        for index, item in unread:
+            full_title = str(item.title)
+            display_title = full_title[:15] + "..." if len(full_title) > 15 else full_title
+            label = index if index is not None else "寫入中"
+            unread_items.append(f"• [{label}] {display_title}\n  ({item.url})")
         if not unread_items: return "Inbox 目前沒有未讀項目。"
-        return "【未讀清單】\n" + "\n".join(unread_items)
+        result = "【未讀清單】\n" + "\n".join(unread_items)
+        if any(index is None for index, _ in unread):
+            result += "\n(「寫入中」的項目尚未寫入 Sheets，稍後才有 ID 可標記為已讀)"
+        return result
     except Exception as e: return f"讀取失敗: {str(e)}"
 
+def _parse_row_ids(row_ids_str: str):
+    """
+    解析列號字串，支援 "2, 5, 7-10" 這類逗號分隔與範圍寫法；回傳排序後不重複的列號 (跳過標題列)。
+    列號超過 MAX_MARK_ROWS 筆時回傳 None (範圍先檢查長度，不會展開)。
+    """
+    row_ids = set()
+    for token in row_ids_str.replace("、", ",").replace("~", "-").split(","):
+        token = token.strip()
+        if "-" in token:
+            start, _, end = token.partition("-")
+            if start.strip().isdigit() and end.strip().isdigit():
+                start, end = sorted((int(start), int(end)))
+                if end - start >= MAX_MARK_ROWS: return None
+                row_ids.update(range(start, end + 1))
+        elif token.isdigit():
+            row_ids.add(int(token))
+        if len(row_ids) > MAX_MARK_ROWS: return None
+    return sorted(r for r in row_ids if r >= 2)
+
+def _contiguous_runs(row_ids):
+    """[2, 3, 4, 7] -> [(2, 4), (7, 7)]"""
+    runs = []
+    for row_id in row_ids:
+        if runs and runs[-1][1] == row_id - 1:
+            runs[-1][1] = row_id
+        else:
+            runs.append([row_id, row_id])
+    return [tuple(run) for run in runs]
+
 def mark_inbox_as_read(row_ids_str: str):
-    """將 Inbox 項目標記為已讀。"""
+    """將 Inbox 項目標記為已讀 (row_ids_str 例如 "2, 5" 或 "2-40")。"""
     service = get_google_service('sheets', 'v4') 
     if not service: return "錯誤：無法連線"
     try:
-        row_ids = [int(x.strip()) for x in row_ids_str.split(',') if x.strip().isdigit()]
-        for row_id in row_ids:
-            service.spreadsheets().values().update(
-                spreadsheetId=SPREADSHEET_ID, range=f"inbox!E{row_id}",
-                valueInputOption="USER_ENTERED", body={'values': [["Read"]]}
-            ).execute()
-        return f"已將 ID {row_ids} 標記為已讀。"
-    except Exception as e: return f"更新失敗: {str(e)}"
\ No newline at end of file
+        row_ids = _parse_row_ids(row_ids_str)
+        if row_ids is None: return f"錯誤：一次最多標記 {MAX_MARK_ROWS} 筆，請縮小範圍。"
+        if not row_ids: return f"錯誤：無法解析列號 '{row_ids_str}'。"
+        # 只接受已寫入 Sheets 的列 (尚未送出的項目沒有 ID；超出範圍會在表尾寫出只有狀態的空列)
+        synced, _ = sheets_cache.get_synced(service, "inbox")
+        last_row = len(synced) + 1
+        invalid = [row_id for row_id in row_ids if row_id > last_row]
+        if invalid:
+            return (f"錯誤：ID {', '.join(map(str, invalid[:5]))} 不存在 (Inbox 目前最後一筆為 {last_row})；"
+                    f"剛收藏的項目需等寫入完成才有 ID。")
+        # 連續的列合併為一個範圍，所有範圍以一次 batchUpdate 寫入
+        runs = _contiguous_runs(row_ids)
+        data = [{'range': f"inbox!E{start}:E{end}", 'values': [["Read"]] * (end - start + 1)} for start, end in runs]
+        service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={'valueInputOption': "USER_ENTERED", 'data': data}
+        ).execute()
+        # 直接更新快取中的狀態欄 (E)，不必重新讀取整個 Inbox (鏡像下次查詢時由快取更新)
+        sheets_cache.patch("inbox", {row_id: {4: "Read"} for row_id in row_ids})
+        summary = ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in runs)
+        return f"已將 {len(row_ids)} 筆 (ID {summary}) 標記為已讀。"
+    except Exception as e: return f"更新失敗: {str(e)}"
@@ -1,5 +1,6 @@
 # tools/todo_list.py
 from services.google_api import get_google_service
+from services.tasklist_resolver import TaskListResolver
 
 # 定義清單別名對應 (Key 為 AI 可能生成的詞，Value 為實際清單名稱)
 LIST_MAPPING = {
@@ -12,36 +13,13 @@ LIST_MAPPING = {
     "plan": "中期計畫"
 }
 
-def _get_tasklist_id(service, list_title: str):
-    # 1. 前處理：正規化輸入名稱
-    query_title = list_title.strip()
-    
-    # 2. 查表對應：如果 AI 給的是別名，轉換成真實名稱
-    # 這裡做一個簡單的關鍵字包含檢查
-    real_title = query_title
-    for key, val in LIST_MAPPING.items():
-        if key in query_title.lower():
-            real_title = val
-            break
-            
-    print(f"查詢清單 '{list_title}' -> 對應為 '{real_title}'")
+# 清單名稱 -> ID 的快取解析 (只在查不到時才呼叫 tasklists().list)
+# 若找不到指定清單，自動存入「日常待辦」 (這裡請填入你最常用的清單名稱)
+tasklist_resolver = TaskListResolver(LIST_MAPPING, default_title="日常待辦")
 
+def _get_tasklist_id(service, list_title: str):
     try:
-        results = service.tasklists().list().execute()
-        items = results.get('items', [])
-        
-        # 3. 精確比對
-        for item in items:
-            if item['title'] == real_title: 
-                return item['id']
-        
-        # 4. 若找不到，嘗試退回預設清單或報錯
-        # 這裡改為：若找不到指定清單，自動存入「日常待辦」並標註原意
-        for item in items:
-            if item['title'] == "日常待辦": # 這裡請填入你最常用的清單名稱
-                return item['id']
-                
-        return "@default"
+        return tasklist_resolver.resolve(service, list_title)
     except Exception: return None
 
 def add_todo_task(title: str, notes: str = "", list_name: str = "Default"):
@@ -58,6 +36,8 @@ def add_todo_task(title: str, notes: str = "", list_name: str = "Default"):
         result = service.tasks().insert(tasklist=tasklist_id, body=task_body).execute()
         return f"已建立任務於【{list_name} (ID對應成功)】：{result.get('title')}"
     except Exception as e:
+        # 清單可能已被刪除或改名：下次重新抓取清單
+        tasklist_resolver.invalidate()
         return f"建立失敗: {e}"
 
 def get_todo_tasks(list_name: str = "日常待辦", max_results: int = 10):
@@ -83,4 +63,5 @@ def get_todo_tasks(list_name: str = "日常待辦", max_results: int = 10):
             formatted_tasks += f"• {title}{note_str}\n"
         return formatted_tasks
     except Exception as e:
+        tasklist_resolver.invalidate()
         return f"查詢失敗: {e}"
\ No newline at end of file
@@ -1,10 +1,10 @@
 import os
 import json
-import requests
 import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
+from services import http_client
 
 load_dotenv()
 
@@ -51,7 +51,7 @@ class TDXClient:
         
         try:
             print("正在向 TDX 申請新 Token...", flush=True)
-            response = requests.post(auth_url, headers=headers, data=data)
+            response = http_client.post(auth_url, headers=headers, data=data)
             response.raise_for_status()
             token_data = response.json()
             
@@ -80,7 +80,7 @@ class TDXClient:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
         try:
-            response = requests.get(url, headers=headers)
+            response = http_client.get(url, headers=headers)
             response.raise_for_status()
             return response.json()
         except Exception as e:
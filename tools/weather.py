@@ -1,8 +1,8 @@
 # tools/weather.py
-import requests
 import urllib3
 from datetime import datetime
 from services.google_api import CWA_API_KEY
+from services import http_client
 import re
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -43,7 +43,7 @@ def get_weather_forecast(location: str = "臺北市"):
 
     try:
         # 使用 params 參數傳遞
-        response = requests.get(base_url, params=params, verify=False)
+        response = http_client.get(base_url, params=params, verify=False)
         data = response.json()
         
         if not data.get('success') == 'true':
@@ -134,7 +134,7 @@ def get_weekly_forecast(location: str = "臺北市"):
     }
 
     try:
-        response = requests.get(base_url, params=params, verify=False)
+        response = http_client.get(base_url, params=params, verify=False)
         data = response.json()
         
         if not data.get('success') == 'true':